@@ -1,63 +1,76 @@
 import py_trees
 
+from behaviour_trees.base import AgentBehaviour
+from behaviour_trees.sensors import *
 
-class PickUp(py_trees.behaviour.Behaviour):
+
+class PickUp(AgentBehaviour):
     def __init__(self, agent, obj_type):
-        super().__init__(f"PickUp_{obj_type}")
-        self.agent = agent
+        super().__init__(f"PickUp_{obj_type}", agent)
         self.obj_type = obj_type
 
-    def update(self):
-        if self.agent.pick_up(self.obj_type):
+    def evaluate(self, agent):
+        if agent.pick_up(self.obj_type):
             return py_trees.common.Status.SUCCESS
         return py_trees.common.Status.FAILURE
 
 
-class Drop(py_trees.behaviour.Behaviour):
+class Drop(AgentBehaviour):
+    sensor_writes = CARRYING
+
     def __init__(self, agent, obj_type):
-        super().__init__(f"Drop_{obj_type}")
-        self.agent = agent
+        super().__init__(f"Drop_{obj_type}", agent)
         self.obj_type = obj_type
+        self.sensor_reads = CARRYING_SENSORS.get(obj_type, 0)
+
+    def evaluate(self, agent):
+        return py_trees.common.Status.SUCCESS if agent.drop(self.obj_type) else py_trees.common.Status.FAILURE
 
-    def update(self):
-        return py_trees.common.Status.SUCCESS if self.agent.drop(self.obj_type) else py_trees.common.Status.FAILURE
 
+class Explore(AgentBehaviour):
+    sensor_reads = 0
+    sensor_writes = AT_HUB
 
-class Explore(py_trees.behaviour.Behaviour):
     def __init__(self, agent):
-        super().__init__("Explore")
-        self.agent = agent
+        super().__init__("Explore", agent)
 
-    def update(self):
-        self.agent.explore()
+    def evaluate(self, agent):
+        agent.explore()
         return py_trees.common.Status.SUCCESS
 
 
-class MoveTowards(py_trees.behaviour.Behaviour):
+class MoveTowards(AgentBehaviour):
+    sensor_reads = 0
+    sensor_writes = AT_HUB
+
     def __init__(self, agent, obj_type):
-        super().__init__(f"MoveTowards_{obj_type}")
-        self.agent = agent
+        super().__init__(f"MoveTowards_{obj_type}", agent)
         self.obj_type = obj_type
 
-    def update(self):
-        self.agent.move_towards(self.obj_type)
+    def evaluate(self, agent):
+        agent.move_towards(self.obj_type)
         return py_trees.common.Status.SUCCESS
 
 
-class MoveAway(py_trees.behaviour.Behaviour):
+class MoveAway(AgentBehaviour):
+    sensor_reads = 0
+    sensor_writes = AT_HUB | AVOIDED
+
     def __init__(self, agent, obj_type):
-        super().__init__(f"MoveAway_{obj_type}")
-        self.agent = agent
+        super().__init__(f"MoveAway_{obj_type}", agent)
         self.obj_type = obj_type
 
-    def update(self):
-        self.agent.move_away(self.obj_type)
+    def evaluate(self, agent):
+        agent.move_away(self.obj_type)
         return py_trees.common.Status.SUCCESS
 
 
-class DummyNode(py_trees.behaviour.Behaviour):
+class DummyNode(AgentBehaviour):
+    sensor_reads = 0
+    sensor_writes = 0
+
     def __init__(self):
         super().__init__(f"DummyNode")
 
-    def update(self):
+    def evaluate(self, agent):
         return py_trees.common.Status.SUCCESS
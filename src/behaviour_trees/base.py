@@ -0,0 +1,25 @@
+import abc
+
+import py_trees
+
+from behaviour_trees.sensors import ALL_SENSORS
+
+
+class AgentBehaviour(py_trees.behaviour.Behaviour):
+    # leaf whose logic takes the agent as an argument, so one instance can also serve many agents through evaluate()
+    # sensor_reads: sensor bits the returned status depends on, None if it depends on anything else
+    # sensor_writes: sensor bits evaluate() may change, 0 only for leaves without any side effect
+    sensor_reads = None
+    sensor_writes = ALL_SENSORS
+
+    def __init__(self, name, agent=None):
+        super().__init__(name)
+        self.agent = agent
+
+    def update(self):
+        return self.evaluate(self.agent)
+
+    # every leaf implements it, py_trees' Behaviour is already an ABC
+    @abc.abstractmethod
+    def evaluate(self, agent):
+        pass
@@ -0,0 +1,105 @@
+from behaviour_trees.flyweight import *
+
+# A tree lowered to four parallel arrays in preorder:
+#   ops[pc]   LEAF / INVERTER / SEQUENCE / SELECTOR (same codes as flyweight kinds)
+#   args[pc]  leaf index for LEAF, memory slot (or -1) for composites
+#   ends[pc]  pc just past the node's subtree, the next sibling starts there
+# and the bound evaluate() of every leaf in `leaves`, the leaf nodes themselves in `behaviours`.
+
+
+class Program:
+    def __init__(self, ops, args, ends, leaves, behaviours, n_slots, names):
+        self.ops = ops
+        self.args = args
+        self.ends = ends
+        self.leaves = leaves
+        self.behaviours = behaviours
+        self.n_slots = n_slots
+        self.names = names
+
+    def __len__(self):
+        return len(self.ops)
+
+    def new_context(self, agent):
+        return TickContext(self, agent)
+
+    def tick(self, context):
+        return execute(self, context)
+
+
+def compile_tree(tree):
+    # FlyweightTree (or a py_trees tree via flyweight.convert) -> Program
+    ops, args, ends, leaves, behaviours, names = [], [], [], [], [], []
+
+    def emit(node):
+        pc = len(ops)
+        ops.append(node.kind)
+        names.append(node.name)
+        if node.kind == LEAF:
+            args.append(len(leaves))
+            leaves.append(node.behaviour.evaluate)
+            behaviours.append(node.behaviour)
+        else:
+            args.append(node.slot)
+        ends.append(-1)
+        for child in node.children:
+            emit(child)
+        ends[pc] = len(ops)
+
+    emit(tree.root)
+    return Program(ops, args, ends, leaves, behaviours, tree.n_slots, names)
+
+
+def execute(program, context, trace=None):
+    # trace, if given, collects the index of every leaf evaluated, in order
+    ops = program.ops
+    args = program.args
+    ends = program.ends
+    leaves = program.leaves
+    agent = context.agent
+    running = context.running
+
+    stack = []
+    pc = 0
+    while True:
+        op = ops[pc]
+        if op != LEAF:
+            # enter the node, memory composites resume at the child that was running
+            stack.append(pc)
+            slot = args[pc]
+            pc = running[slot] if op != INVERTER and slot >= 0 and running[slot] >= 0 else pc + 1
+            continue
+
+        leaf = args[pc]
+        status = leaves[leaf](agent)
+        if trace is not None:
+            trace.append(leaf)
+        done = pc
+        # hand the status up until some composite wants its next child
+        while stack:
+            parent = stack[-1]
+            op = ops[parent]
+            if op == INVERTER:
+                if status is SUCCESS:
+                    status = FAILURE
+                elif status is FAILURE:
+                    status = SUCCESS
+            else:
+                slot = args[parent]
+                if status is RUNNING:
+                    if slot >= 0:
+                        running[slot] = done
+                elif status is (FAILURE if op == SEQUENCE else SUCCESS):
+                    if slot >= 0:
+                        running[slot] = -1
+                else:
+                    pc = ends[done]
+                    if pc < ends[parent]:
+                        break
+                    if slot >= 0:
+                        running[slot] = -1
+                    status = SUCCESS if op == SEQUENCE else FAILURE
+            stack.pop()
+            done = parent
+        else:
+            return status
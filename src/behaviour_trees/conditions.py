@@ -1,102 +1,119 @@
 import py_trees
 
+from behaviour_trees.base import AgentBehaviour
+from behaviour_trees.sensors import *
 from environment.objects import Food, Debris
 from environment.utils import *
 
 
-class IsCarrying(py_trees.behaviour.Behaviour):
+class IsCarrying(AgentBehaviour):
+    sensor_writes = 0
+
     def __init__(self, agent, obj_type):
-        super().__init__(f"IsCarrying_{obj_type}")
-        self.agent = agent
+        super().__init__(f"IsCarrying_{obj_type}", agent)
         self.obj_type = obj_type
+        self.sensor_reads = CARRYING_SENSORS.get(obj_type, 0)
 
-    def update(self):
-        obj = self.agent.carrying
+    def evaluate(self, agent):
+        obj = agent.carrying
         return (
             py_trees.common.Status.SUCCESS
-            if obj and (isinstance(obj, Food) or isinstance(obj, Debris)) and self.agent.carrying.type == self.obj_type
+            if obj and (isinstance(obj, Food) or isinstance(obj, Debris)) and agent.carrying.type == self.obj_type
             else py_trees.common.Status.FAILURE
         )
 
 
-class IsDroppable(py_trees.behaviour.Behaviour):
+class IsDroppable(AgentBehaviour):
+    sensor_writes = 0
+
     def __init__(self, agent, at_hub=True):
-        super().__init__(f"IsDroppable_{"Hub" if at_hub else "Site"})")
-        self.agent = agent
+        super().__init__(f"IsDroppable_{"Hub" if at_hub else "Site"})", agent)
         self.at_hub = at_hub
+        self.sensor_reads = CARRYING_FOOD | AT_HUB if at_hub else 0
 
-    def update(self):
+    def evaluate(self, agent):
         if not self.at_hub:
             return py_trees.common.Status.FAILURE
-        if self.agent.carrying is not None and self.agent.carrying.type == "Food" and dist(self.agent.model.hub.pos,
-                                                                                           self.agent.pos) < self.agent.model.hub.radius:
+        if agent.carrying is not None and agent.carrying.type == "Food" and dist(agent.model.hub.pos,
+                                                                                 agent.pos) < agent.model.hub.radius:
             return py_trees.common.Status.SUCCESS
         else:
             return py_trees.common.Status.FAILURE
 
 
-class IsCarryable(py_trees.behaviour.Behaviour):
+class IsCarryable(AgentBehaviour):
+    sensor_writes = 0
+
     def __init__(self, agent, obj_type):
-        super().__init__(f"IsCarriable_{obj_type}")
-        self.agent = agent
+        super().__init__(f"IsCarriable_{obj_type}", agent)
         self.obj_type = obj_type
+        self.sensor_reads = 0
 
-    def update(self):
+    def evaluate(self, agent):
         if self.obj_type == DObjects.Food or self.obj_type == DObjects.Debris:
             return py_trees.common.Status.SUCCESS
         return py_trees.common.Status.FAILURE
 
 
-class NeighbourObjects(py_trees.behaviour.Behaviour):
+class NeighbourObjects(AgentBehaviour):
+    sensor_writes = 0
+
     def __init__(self, agent, obj_type):
-        super().__init__(f"NeighbourObjects_{obj_type}")
-        self.agent = agent
+        super().__init__(f"NeighbourObjects_{obj_type}", agent)
         self.obj_type = obj_type
+        self.sensor_reads = NEAREST_SENSORS.get(obj_type, 0)
 
-    def update(self):
-        if self.obj_type is DObjects.Food and self.agent.blackboard.nearest_food is not None:
+    def evaluate(self, agent):
+        if self.obj_type is DObjects.Food and agent.blackboard.nearest_food is not None:
             return py_trees.common.Status.SUCCESS
-        elif self.obj_type is DObjects.Debris and self.agent.blackboard.nearest_debris is not None:
+        elif self.obj_type is DObjects.Debris and agent.blackboard.nearest_debris is not None:
             return py_trees.common.Status.SUCCESS
-        elif self.obj_type is SObjects.Hub and self.agent.blackboard.nearest_hub is not None:
+        elif self.obj_type is SObjects.Hub and agent.blackboard.nearest_hub is not None:
             return py_trees.common.Status.SUCCESS
-        elif self.obj_type is SObjects.Site and self.agent.blackboard.nearest_site is not None:
+        elif self.obj_type is SObjects.Site and agent.blackboard.nearest_site is not None:
             return py_trees.common.Status.SUCCESS
         return py_trees.common.Status.FAILURE
 
 
-class AvoidedLastStep(py_trees.behaviour.Behaviour):
+class AvoidedLastStep(AgentBehaviour):
+    sensor_writes = 0
+
     def __init__(self, agent, obj_type):
-        super().__init__("AvoidedLastStep")
-        self.agent = agent
+        super().__init__("AvoidedLastStep", agent)
         self.obj_type = obj_type
+        self.sensor_reads = AVOIDED_SENSORS.get(obj_type, 0)
 
-    def update(self):
-        if self.obj_type == SObjects.Hub and self.agent.blackboard.avoided_last_step_hub:
+    def evaluate(self, agent):
+        if self.obj_type == SObjects.Hub and agent.blackboard.avoided_last_step_hub:
             return py_trees.common.Status.SUCCESS
-        if self.obj_type == SObjects.Site and self.agent.blackboard.avoided_last_step_site:
+        if self.obj_type == SObjects.Site and agent.blackboard.avoided_last_step_site:
             return py_trees.common.Status.SUCCESS
         return py_trees.common.Status.FAILURE
 
 
-class VisitedBefore(py_trees.behaviour.Behaviour):
+class VisitedBefore(AgentBehaviour):
+    sensor_writes = 0
+
     def __init__(self, agent, obj_type):
-        super().__init__(f"VisitedBefore_{obj_type}")
-        self.agent = agent
+        super().__init__(f"VisitedBefore_{obj_type}", agent)
         self.obj_type = obj_type
+        self.sensor_reads = VISITED_SENSORS.get(obj_type, 0)
 
-    def update(self):
-        if self.obj_type == SObjects.Hub and self.agent.blackboard.visited_hub:
+    def evaluate(self, agent):
+        if self.obj_type == SObjects.Hub and agent.blackboard.visited_hub:
             return py_trees.common.Status.SUCCESS
-        if self.obj_type == SObjects.Site and self.agent.blackboard.visited_site:
+        if self.obj_type == SObjects.Site and agent.blackboard.visited_site:
             return py_trees.common.Status.SUCCESS
         return py_trees.common.Status.FAILURE
 
 
 # idk boss
-class CanMove(py_trees.behaviour.Behaviour):
+class CanMove(AgentBehaviour):
+    sensor_writes = 0
+    sensor_reads = 0
+
     def __init__(self):
         super().__init__("CanMove")
 
-    def update(self):
+    def evaluate(self, agent):
         return py_trees.common.Status.SUCCESS
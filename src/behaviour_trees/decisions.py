@@ -0,0 +1,103 @@
+from behaviour_trees.bytecode import *
+from behaviour_trees.sensors import *
+
+# Memoized ticks. With the composites' memory idle, a tick's control flow only depends on the sensor bits its
+# conditions read, so the first tick for a given sensor vector is interpreted and recorded, and later ones just run
+# the recorded actions. A recording is only kept if no leaf read a bit that an earlier action in the same tick
+# could have changed, and if the tick left the memory idle again; otherwise that sensor vector is always interpreted.
+
+_UNCACHEABLE = None
+
+
+class Decision:
+    __slots__ = ("actions", "status")
+
+    def __init__(self, actions, status):
+        self.actions = actions
+        self.status = status
+
+
+class DecisionStats:
+    # shared by every table, so one number covers a whole run
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0  # interpreted because of memory state or an uncacheable sensor vector
+
+    def ticks(self):
+        return self.hits + self.misses + self.bypassed
+
+    def hit_rate(self):
+        ticks = self.ticks()
+        return self.hits / ticks if ticks else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed, "hit_rate": self.hit_rate()}
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+
+decision_stats = DecisionStats()
+
+
+class DecisionTree:
+    def __init__(self, program, max_entries):
+        self.program = program
+        self.n_slots = program.n_slots
+        self.max_entries = max_entries
+        self.table = {}
+        self.read_mask = 0
+        for behaviour in program.behaviours:
+            if behaviour.sensor_reads is not None:
+                self.read_mask |= behaviour.sensor_reads
+
+    def __len__(self):
+        return len(self.table)
+
+    def new_context(self, agent):
+        return TickContext(self, agent)
+
+    def tick(self, context):
+        running = context.running
+        if running and max(running) >= 0:
+            decision_stats.bypassed += 1
+            return execute(self.program, context)
+
+        agent = context.agent
+        key = read_sensors(agent, self.read_mask)
+        decision = self.table.get(key, self)
+        if decision is self:
+            decision_stats.misses += 1
+            trace = []
+            status = execute(self.program, context, trace)
+            if len(self.table) < self.max_entries:
+                self.table[key] = self.record(trace, status, running)
+            return status
+        if decision is _UNCACHEABLE:
+            decision_stats.bypassed += 1
+            return execute(self.program, context)
+
+        decision_stats.hits += 1
+        for action in decision.actions:
+            action(agent)
+        return decision.status
+
+    def record(self, trace, status, running):
+        if running and max(running) >= 0:
+            return _UNCACHEABLE
+        behaviours = self.program.behaviours
+        leaves = self.program.leaves
+        actions = []
+        dirty = 0
+        for leaf in trace:
+            behaviour = behaviours[leaf]
+            reads = behaviour.sensor_reads
+            if reads is None or reads & dirty:
+                return _UNCACHEABLE
+            if behaviour.sensor_writes:
+                actions.append(leaves[leaf])
+                dirty |= behaviour.sensor_writes
+        return Decision(tuple(actions), status)
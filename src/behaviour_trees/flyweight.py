@@ -0,0 +1,114 @@
+import py_trees
+
+from behaviour_trees.base import AgentBehaviour
+
+SUCCESS = py_trees.common.Status.SUCCESS
+FAILURE = py_trees.common.Status.FAILURE
+RUNNING = py_trees.common.Status.RUNNING
+
+# node kinds
+LEAF = 0
+INVERTER = 1
+SEQUENCE = 2
+SELECTOR = 3
+
+
+class FlyweightNode:
+    # immutable once built, the only per-agent state (memory composites' running child) lives in a TickContext
+    __slots__ = ("kind", "name", "children", "behaviour", "slot")
+
+    def __init__(self, kind, name, children=(), behaviour=None, slot=-1):
+        self.kind = kind
+        self.name = name
+        self.children = tuple(children)
+        self.behaviour = behaviour
+        self.slot = slot
+
+    def iterate(self):
+        for child in self.children:
+            yield from child.iterate()
+        yield self
+
+
+def convert(node, children=None, slots=None):
+    # py_trees node (built without an agent) -> FlyweightNode, memory composites take the next slot from slots
+    if children is None:
+        children = [convert(child, slots=slots) for child in node.children]
+    if isinstance(node, py_trees.decorators.Inverter):
+        return FlyweightNode(INVERTER, node.name, children)
+    if isinstance(node, py_trees.composites.Sequence) or isinstance(node, py_trees.composites.Selector):
+        kind = SEQUENCE if isinstance(node, py_trees.composites.Sequence) else SELECTOR
+        slot = -1
+        if node.memory:
+            if slots is None:
+                raise ValueError(f"Memory composite {node.name} needs a per-tree slot")
+            slot = slots[0]
+            slots[0] += 1
+        return FlyweightNode(kind, node.name, children, slot=slot)
+    if isinstance(node, AgentBehaviour):
+        return FlyweightNode(LEAF, node.name, behaviour=node)
+    raise ValueError(f"No flyweight equivalent for {type(node).__name__}")
+
+
+def has_memory(node):
+    if isinstance(node, py_trees.composites.Composite) and node.memory:
+        return True
+    return any(has_memory(child) for child in node.children)
+
+
+class FlyweightTree:
+    def __init__(self, root, n_slots):
+        self.root = root
+        self.n_slots = n_slots
+
+    def new_context(self, agent):
+        return TickContext(self, agent)
+
+    def tick(self, context):
+        return _tick(self.root, context)
+
+
+class TickContext:
+    # per-agent state for any tree with n_slots and tick(context), see also bytecode.Program
+    __slots__ = ("tree", "agent", "running")
+
+    def __init__(self, tree, agent):
+        self.tree = tree
+        self.agent = agent
+        self.running = [-1] * tree.n_slots
+
+    def tick(self):
+        return self.tree.tick(self)
+
+
+def _tick(node, context):
+    # mirrors py_trees' Sequence/Selector (with and without memory) and Inverter
+    kind = node.kind
+    if kind == LEAF:
+        return node.behaviour.evaluate(context.agent)
+    if kind == INVERTER:
+        status = _tick(node.children[0], context)
+        if status == SUCCESS:
+            return FAILURE
+        if status == FAILURE:
+            return SUCCESS
+        return status
+
+    slot = node.slot
+    first = 0
+    if slot >= 0 and context.running[slot] >= 0:
+        first = context.running[slot]
+    children = node.children
+    for i in range(first, len(children)):
+        status = _tick(children[i], context)
+        if status == RUNNING:
+            if slot >= 0:
+                context.running[slot] = i
+            return RUNNING
+        if (status == FAILURE) if kind == SEQUENCE else (status == SUCCESS):
+            if slot >= 0:
+                context.running[slot] = -1
+            return status
+    if slot >= 0:
+        context.running[slot] = -1
+    return SUCCESS if kind == SEQUENCE else FAILURE
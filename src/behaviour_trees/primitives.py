@@ -3,6 +3,7 @@ import py_trees.decorators
 from behaviour_trees.actions import *
 from behaviour_trees.builder import *
 from behaviour_trees.conditions import *
+from behaviour_trees.flyweight import *
 
 
 def composite_carry(agent, obj_type):
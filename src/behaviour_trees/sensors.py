@@ -0,0 +1,56 @@
+from environment.objects import Food, Debris
+from environment.utils import *
+
+# Boolean inputs the condition leaves look at. Each leaf declares which of these its status depends on
+# (sensor_reads, None when it depends on anything else) and which it may change (sensor_writes).
+NEAREST_FOOD = 1 << 0
+NEAREST_DEBRIS = 1 << 1
+NEAREST_HUB = 1 << 2
+NEAREST_SITE = 1 << 3
+VISITED_HUB = 1 << 4
+VISITED_SITE = 1 << 5
+AVOIDED_HUB = 1 << 6
+AVOIDED_SITE = 1 << 7
+CARRYING_FOOD = 1 << 8
+CARRYING_DEBRIS = 1 << 9
+AT_HUB = 1 << 10  # within the hub radius, what IsDroppable checks
+ALL_SENSORS = (1 << 11) - 1
+
+CARRYING = CARRYING_FOOD | CARRYING_DEBRIS
+AVOIDED = AVOIDED_HUB | AVOIDED_SITE
+
+# keyed the way the leaves compare obj_type, so a type that can never match reads nothing
+NEAREST_SENSORS = {DObjects.Food: NEAREST_FOOD, DObjects.Debris: NEAREST_DEBRIS, SObjects.Hub: NEAREST_HUB,
+                   SObjects.Site: NEAREST_SITE}
+VISITED_SENSORS = {SObjects.Hub: VISITED_HUB, SObjects.Site: VISITED_SITE}
+AVOIDED_SENSORS = {SObjects.Hub: AVOIDED_HUB, SObjects.Site: AVOIDED_SITE}
+CARRYING_SENSORS = {"Food": CARRYING_FOOD, "Debris": CARRYING_DEBRIS}
+
+
+def read_sensors(agent, mask=ALL_SENSORS):
+    # only the bits in mask are computed, the rest stay 0
+    bits = 0
+    bb = agent.blackboard
+    if mask & NEAREST_FOOD and bb.nearest_food is not None:
+        bits |= NEAREST_FOOD
+    if mask & NEAREST_DEBRIS and bb.nearest_debris is not None:
+        bits |= NEAREST_DEBRIS
+    if mask & NEAREST_HUB and bb.nearest_hub is not None:
+        bits |= NEAREST_HUB
+    if mask & NEAREST_SITE and bb.nearest_site is not None:
+        bits |= NEAREST_SITE
+    if mask & VISITED_HUB and bb.visited_hub:
+        bits |= VISITED_HUB
+    if mask & VISITED_SITE and bb.visited_site:
+        bits |= VISITED_SITE
+    if mask & AVOIDED_HUB and bb.avoided_last_step_hub:
+        bits |= AVOIDED_HUB
+    if mask & AVOIDED_SITE and bb.avoided_last_step_site:
+        bits |= AVOIDED_SITE
+    if mask & CARRYING:
+        obj = agent.carrying
+        if obj and (isinstance(obj, Food) or isinstance(obj, Debris)):
+            bits |= CARRYING_SENSORS.get(obj.type, 0) & mask
+    if mask & AT_HUB and dist(agent.model.hub.pos, agent.pos) < agent.model.hub.radius:
+        bits |= AT_HUB
+    return bits
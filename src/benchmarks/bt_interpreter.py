@@ -0,0 +1,127 @@
+import random
+import time
+import warnings
+
+import numpy as np
+
+from betr_geese.config import *
+from behaviour_trees.decisions import decision_stats
+from environment.genotype_to_phenotype import *
+from environment.swarm_agent import BT_BACKENDS, Genome
+from environment.swarm_model import SwarmModel
+
+
+def _agent_state(agent):
+    bb = agent.blackboard
+    return (agent.pos.copy(), bb.visited_hub, bb.visited_site, bb.avoided_last_step_hub, bb.avoided_last_step_site)
+
+
+def _restore(agent, state):
+    bb = agent.blackboard
+    agent.pos = state[0].copy()
+    bb.visited_hub, bb.visited_site, bb.avoided_last_step_hub, bb.avoided_last_step_site = state[1:]
+
+
+def _tick_once(agent, codons, backend):
+    genome = Genome(codons, agent)
+    if backend == "py_trees":
+        genome.bt.tick()
+        return genome.bt.root.status
+    return genome._phenotype.executable(backend).new_context(agent).tick()
+
+
+def check_ticks(n_genomes=300, seed=0):
+    # differential check: every backend must return the same status and leave the agent in the same state
+    random.seed(seed)
+    model = SwarmModel(n_agents=10, n_food=20, n_debris=20, seed=seed)
+    for _ in range(5):
+        model.step()
+    agents = list(model.agents)
+    for i in range(n_genomes):
+        codons = [random.randint(0, 255) for _ in range(random.choice([5, GENOME_SIZE, 3 * GENOME_SIZE]))]
+        agent = agents[i % len(agents)]
+        start = _agent_state(agent)
+        outcomes = []
+        for backend in BT_BACKENDS:
+            _restore(agent, start)
+            random.seed(i)
+            status = _tick_once(agent, codons, backend)
+            end = _agent_state(agent)
+            outcomes.append((status, end[0].tolist(), end[1:]))
+        assert all(o == outcomes[0] for o in outcomes), f"backends disagree on genome {codons}"
+        _restore(agent, start)
+
+
+def _trajectory(backend, steps, seed, **kwargs):
+    random.seed(seed)
+    model = SwarmModel(seed=seed, bt_backend=backend, **kwargs)
+    positions = []
+    for _ in range(steps):
+        model.step()
+        positions.append(np.array([a.pos for a in sorted(model.agents, key=lambda a: a.unique_id)]))
+    return positions
+
+
+def check_runs(steps=20, seed=1):
+    reference = _trajectory("py_trees", steps, seed, n_agents=20, n_food=20, n_debris=20)
+    for backend in BT_BACKENDS[1:]:
+        positions = _trajectory(backend, steps, seed, n_agents=20, n_food=20, n_debris=20)
+        assert all(np.array_equal(a, b, equal_nan=True) for a, b in zip(reference, positions)), \
+            f"{backend} trajectories differ from py_trees"
+
+
+def throughput(n_agents=N_AGENTS, steps=50, seed=2):
+    random.seed(seed)
+    learning = SwarmModel(n_agents=2, seed=seed)
+    template = max((a.genome for a in learning.agents), key=lambda g: len(g._phenotype.nodes))
+    results = {}
+    for backend in BT_BACKENDS:
+        random.seed(seed)
+        model = SwarmModel(n_agents=n_agents, template_genome=template, bt_backend=backend, seed=seed)
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        results[backend] = steps / (time.perf_counter() - start)
+    return results
+
+
+def tick_throughput(n_genomes=20, ticks=500, seed=3):
+    # ticks alone, the step numbers above also include sensing and the rest of act()
+    random.seed(seed)
+    model = SwarmModel(n_agents=n_genomes, seed=seed)
+    pairs = [(agent, agent.genome.genome) for agent in model.agents]
+    results = {}
+    for backend in BT_BACKENDS:
+        tickers = []
+        for agent, codons in pairs:
+            genome = Genome(codons, agent)
+            tickers.append(genome.bt.tick if backend == "py_trees"
+                           else genome._phenotype.executable(backend).new_context(agent).tick)
+        start = time.perf_counter()
+        for tick in tickers:
+            for _ in range(ticks):
+                tick()
+        results[backend] = len(tickers) * ticks / (time.perf_counter() - start)
+    return results
+
+
+def decision_hit_rate(n_agents=30, steps=STEPS, seed=4):
+    # share of ticks answered from the decision tables, i.e. without evaluating a single condition
+    random.seed(seed)
+    decision_stats.clear()
+    model = SwarmModel(n_agents=n_agents, bt_backend="decision", seed=seed)
+    for _ in range(steps):
+        model.step()
+    return decision_stats.stats()
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_ticks()
+    check_runs()
+    print("differential checks passed")
+    for backend, steps_per_second in throughput().items():
+        print(f"{backend:>9}: {steps_per_second:8.1f} steps/s")
+    for backend, ticks_per_second in tick_throughput().items():
+        print(f"{backend:>9}: {ticks_per_second:8.0f} ticks/s")
+    print("decision tables:", decision_hit_rate())
@@ -0,0 +1,39 @@
+import os
+import random
+import tempfile
+import time
+import warnings
+
+from benchmarks.common import check_resume, moving_template
+from environment.swarm_model import SwarmModel
+
+
+def size(sizes=(100, 1000), steps=2, seed=1):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "checkpoint.npz")
+        for n_agents in sizes:
+            random.seed(seed)
+            model = SwarmModel(n_agents=n_agents, seed=seed, bt_backend="decision")
+            for _ in range(steps):
+                model.step()
+            start = time.perf_counter()
+            model.save_checkpoint(path)
+            save_time = time.perf_counter() - start
+            start = time.perf_counter()
+            SwarmModel.load_checkpoint(path)
+            load_time = time.perf_counter() - start
+            results[n_agents] = (os.path.getsize(path), save_time, load_time)
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_resume(n_agents=30, n_food=20, n_debris=20)
+    check_resume(n_agents=30, n_food=20, n_debris=20, engine="vectorized", bt_backend="decision", seed=1)
+    check_resume(n_agents=30, spatial_index=False, bt_backend="bytecode", cut=7, seed=2)
+    check_resume(n_agents=100, template_genome=moving_template(3), bt_backend="flyweight", cut=5, seed=3)
+    print("resume checks passed")
+    for n_agents, (n_bytes, save_time, load_time) in size().items():
+        print(f"{n_agents:6} agents: {n_bytes / 1024:8.1f} KiB, save {save_time * 1000:7.1f} ms, "
+              f"load {load_time * 1000:7.1f} ms")
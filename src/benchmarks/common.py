@@ -0,0 +1,84 @@
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.swarm_agent import Genome
+from environment.swarm_model import ENGINES, SwarmModel
+
+# Fixtures and differential checks the benchmark scripts share
+
+
+def flags(agent):
+    bb = agent.blackboard
+    return (bb.visited_hub, bb.visited_site, bb.avoided_last_step_hub, bb.avoided_last_step_site,
+            bb.nearest_hub is not None, bb.nearest_site is not None, bb.is_carrying)
+
+
+def snapshot(model):
+    names = {id(obj): i for i, obj in enumerate(model.food + model.debris)}
+    names[id(None)] = None
+    agents = sorted(model.agents, key=lambda a: a.unique_id)
+    return (
+        np.array([a.pos for a in agents]),
+        [names[id(a.carrying)] for a in agents],
+        [flags(a) for a in agents],
+        [(names[id(a.blackboard.nearest_food)], names[id(a.blackboard.nearest_debris)]) for a in agents],
+        [list(a.genome.genome) for a in agents],
+        [a.genome_storage_pool.tolist() if a._should_evolve else [] for a in agents],
+        np.array([o.pos for o in model.food + model.debris], dtype='float64'),
+    )
+
+
+def same(a, b):
+    return all(np.array_equal(x, y, equal_nan=True) if isinstance(x, np.ndarray) else x == y for x, y in zip(a, b))
+
+
+def check_engines(steps=40, seed=0, **kwargs):
+    # differential check: the vectorized engine must reproduce the reference engine step for step
+    runs = []
+    for engine in ENGINES:
+        random.seed(seed)
+        model = SwarmModel(seed=seed, engine=engine, **kwargs)
+        snapshots = []
+        for _ in range(steps):
+            model.step()
+            snapshots.append(snapshot(model))
+        runs.append(snapshots)
+    for step, (reference, vectorized) in enumerate(zip(*runs)):
+        assert same(reference, vectorized), f"engines diverge at step {step} with {kwargs}"
+
+
+def moving_template(seed):
+    # a fixed genome whose agents actually move, evolving swarms are dominated by the O(n^2) genome exchange
+    rng = random.Random(seed)
+    while True:
+        template = Genome([rng.randint(0, 255) for _ in range(GENOME_SIZE)], None)
+        state = random.getstate()
+        model = SwarmModel(n_agents=5, n_food=5, n_debris=5, template_genome=template, bt_backend="bytecode")
+        model.step()
+        random.setstate(state)
+        if all(np.isfinite(a.pos).all() and a.pos.any() for a in model.agents):
+            return template
+
+
+def check_resume(steps=30, cut=12, seed=0, **kwargs):
+    # a run resumed from a checkpoint must continue exactly like the one that wrote it
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "checkpoint.npz")
+        random.seed(seed)
+        model = SwarmModel(seed=seed, **kwargs)
+        snapshots = []
+        for step in range(steps):
+            model.step()
+            snapshots.append(snapshot(model))
+            if step + 1 == cut:
+                model.save_checkpoint(path)
+        # the global random state is part of the checkpoint
+        random.seed(seed + 1)
+        resumed = SwarmModel.load_checkpoint(path)
+        for step in range(cut, steps):
+            resumed.step()
+            assert same(snapshots[step], snapshot(resumed)), f"resumed run diverges at step {step} with {kwargs}"
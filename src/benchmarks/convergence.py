@@ -0,0 +1,116 @@
+import os
+import random
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import same, snapshot
+from betr_geese.runner import run_learning
+from environment.convergence import ConvergenceMonitor, population_stats
+from environment.swarm_model import SwarmModel
+
+
+def _learn(seed, monitor=None, steps=1200, n_agents=50, **kwargs):
+    random.seed(seed)
+    model = SwarmModel(n_agents=n_agents, seed=seed, bt_backend="decision", **kwargs)
+    if monitor is not None:
+        monitor.attach(model)
+    start = time.perf_counter()
+    while model.running and model.time < steps:
+        model.step()
+    return model, time.perf_counter() - start
+
+
+def _plateau(rows, window, tolerance):
+    before, last = rows[-2 * window:-window].mean(axis=0), rows[-window:].mean(axis=0)
+    return (np.abs(last - before) <= tolerance).all()
+
+
+def check_monitor(seed=0, window=40, min_steps=100):
+    # the monitor only reads the model: up to the stop the run is the unmonitored one, and it stops at the first
+    # step the criterion holds
+    monitor = ConvergenceMonitor(window=window, min_steps=min_steps)
+    model, _ = _learn(seed, monitor, steps=600, n_agents=30)
+    assert monitor.stop_step == model.time and not model.running and monitor.reason == "plateau", monitor.reason
+    times, rows = monitor.series()
+    assert np.array_equal(times, np.arange(1, model.time + 1))
+    assert np.allclose(rows[:, 3:], model.metric_series())
+    assert np.allclose(rows[-1, :3], population_stats(model))
+    assert _plateau(rows, window, monitor.tolerance)
+    assert not any(_plateau(rows[:t], window, monitor.tolerance) for t in range(max(min_steps, 2 * window),
+                                                                                len(rows)))
+    plain, _ = _learn(seed, steps=model.time, n_agents=30)
+    assert same(snapshot(model), snapshot(plain))
+    assert model.random.getstate() == plain.random.getstate()
+
+
+def check_resume(seed=0, window=40, min_steps=100):
+    # a run resumed from a checkpoint stops at the step and for the reason the uninterrupted run did, also when the
+    # checkpoint was written at the stop step
+    monitor = ConvergenceMonitor(window=window, min_steps=min_steps)
+    model, _ = _learn(seed, monitor, steps=600, n_agents=30)
+    for cut in (min_steps - 10, model.time - 5, model.time):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "checkpoint.npz")
+            first = ConvergenceMonitor(window=window, min_steps=min_steps)
+            interrupted, _ = _learn(seed, first, steps=cut, n_agents=30)
+            interrupted.save_checkpoint(path)
+            resumed = SwarmModel.load_checkpoint(path)
+        second = ConvergenceMonitor(window=window, min_steps=min_steps).attach(resumed)
+        while resumed.running and resumed.time < 600:
+            resumed.step()
+        assert (second.stop_step, second.reason) == (monitor.stop_step, monitor.reason), (cut, second.stop_step)
+        assert np.array_equal(second.series()[1], monitor.series()[1])
+        # sensed blackboard state is not checkpointed, a run resumed at the stop step has not sensed again
+        keep = (0, 1, 4, 5, 6)
+        assert same([snapshot(model)[i] for i in keep], [snapshot(resumed)[i] for i in keep])
+
+
+def check_empty(seed=0, window=40, min_steps=100):
+    # the nan metric of a world without food or without debris doesn't keep the run going
+    for objects in ({"n_food": 0}, {"n_debris": 0}):
+        monitor = ConvergenceMonitor(window=window, min_steps=min_steps)
+        _learn(seed, monitor, steps=600, n_agents=30, **objects)
+        assert monitor.reason == "plateau", objects
+
+
+def check_runner(seed=4):
+    record = run_learning(0, seed, n_agents=30, steps=600, early_stopping=True)
+    assert record["stop_reason"] == "plateau" and record["stop_step"] < 600, record
+    record = run_learning(0, seed, n_agents=30, steps=50)
+    assert record["stop_reason"] is None and record["stop_step"] == 50, record
+
+
+def wall_clock(seeds=(0, 1, 2), n_agents=50):
+    # seconds for full 1200 step learning runs vs the same runs stopped by the monitor
+    results = {}
+    for seed in seeds:
+        _, full = _learn(seed, n_agents=n_agents)
+        monitor = ConvergenceMonitor()
+        model, early = _learn(seed, monitor, n_agents=n_agents)
+        results[seed] = (full, early, monitor.stop_step)
+    return results
+
+
+def overhead(n_agents=100, rounds=200, seed=0):
+    # seconds per end_step(), what the monitor adds to a step
+    model, _ = _learn(seed, steps=20, n_agents=n_agents)
+    monitor = ConvergenceMonitor(min_steps=0)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        monitor.end_step(model)
+    return (time.perf_counter() - start) / rounds
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_monitor()
+    check_resume()
+    check_empty()
+    check_runner()
+    print("convergence checks passed")
+    for seed, (full, early, stop_step) in wall_clock().items():
+        print(f"seed {seed}: {full:6.2f} s for 1200 steps, {early:6.2f} s stopped at step {stop_step}")
+    print(f"monitor: {overhead() * 1e6:.1f} us/step with 100 agents")
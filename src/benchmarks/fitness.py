@@ -0,0 +1,39 @@
+import random
+import time
+
+from betr_geese.config import *
+from environment.genotype_to_phenotype import *
+
+
+class _Genome:
+    def __init__(self, genome):
+        self.genome = genome
+        self.bt = build_bt_from_genome_grammar(None, genome)
+
+
+def run(pool_size=STORAGE_THRESHOLD * 20, rounds=50, seed=0):
+    random.seed(seed)
+    pool = [_Genome([random.randint(0, 50) for _ in range(GENOME_SIZE)]) for _ in range(pool_size)]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        tree = [tree_diversity(g.bt) + tree_exploration(g.bt) / 2 for g in pool]
+    tree_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        single = [calculate_fitness(g) for g in pool]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        batch = calculate_fitness_batch(pool)
+    batch_time = time.perf_counter() - start
+
+    assert tree == single == batch.tolist(), "signature fitness differs from the tree walk"
+    return {"tree walk": tree_time, "signature": single_time, "signature batch": batch_time}
+
+
+if __name__ == '__main__':
+    for name, elapsed in run().items():
+        print(f"{name:>16}: {elapsed:.4f}s")
@@ -0,0 +1,71 @@
+import random
+import time
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.genome_pool import GenomePool
+from environment.genotype_to_phenotype import *
+
+
+class _Genome:
+    def __init__(self, genome):
+        self.genome = genome
+        self.fitness = calculate_fitness(self)
+
+
+def _list_evolve(pool, mutation_prob=0.01, codon_bits=CODON_BITS):
+    # the storage pool as it was, a list of Genome objects with one random draw per codon
+    pool.sort(key=lambda x: x.fitness, reverse=True)
+    parents = pool[:TRUNCATION_SIZE]
+    children = []
+    for i in range(0, len(parents) - 1, 2):
+        if random.random() > CROSSOVER_PROB:
+            continue
+        parent1, parent2 = parents[i].genome, parents[i + 1].genome
+        point = random.randint(0, len(parent1) - 1)
+        children.append(_Genome(parent1[:point] + parent2[point:]))
+        children.append(_Genome(parent2[:point] + parent1[point:]))
+    for child in children:
+        for i, codon in enumerate(child.genome):
+            if random.random() < mutation_prob:
+                child.genome[i] = codon ^ (1 << random.randint(0, codon_bits - 1))
+        child.fitness = calculate_fitness(child)
+    children.sort(key=lambda x: compute_diversity(x), reverse=True)
+    return children[:STORAGE_THRESHOLD]
+
+
+def run(pool_sizes=(STORAGE_THRESHOLD + 1, 50, 200), genome_sizes=(GENOME_SIZE, 100), rounds=200, seed=0):
+    results = {}
+    for genome_size in genome_sizes:
+        for pool_size in pool_sizes:
+            rng = random.Random(seed)
+            rows = [[rng.randint(0, 50) for _ in range(genome_size)] for _ in range(pool_size)]
+            # warm the phenotype cache so both sides pay the same derivations
+            for row in rows:
+                phenotype_cache.get(row)
+
+            lists = [[_Genome(row[:]) for row in rows] for _ in range(rounds)]
+            random.seed(seed)
+            start = time.perf_counter()
+            for pool in lists:
+                _list_evolve(pool)
+            list_time = (time.perf_counter() - start) / rounds
+
+            pools = []
+            for _ in range(rounds):
+                pools.append(GenomePool(genome_size, pool_size))
+                pools[-1].extend(rows)
+            generator = np.random.default_rng(seed)
+            start = time.perf_counter()
+            for pool in pools:
+                pool.evolve(generator)
+            array_time = (time.perf_counter() - start) / rounds
+            results[(genome_size, pool_size)] = (list_time, array_time)
+    return results
+
+
+if __name__ == '__main__':
+    for (genome_size, pool_size), (list_time, array_time) in run().items():
+        print(f"{genome_size:4} codons, pool of {pool_size:4}: list {list_time * 1e6:8.1f} us, "
+              f"codon matrix {array_time * 1e6:8.1f} us")
@@ -0,0 +1,46 @@
+import pickle
+import time
+import warnings
+
+from evolution.islands import emigrants, run_islands
+from environment.swarm_model import SwarmModel
+
+
+def check_reproducible(**kwargs):
+    # migrants are merged in sender order, so process scheduling must not leak into the result
+    assert run_islands(**kwargs) == run_islands(**kwargs), f"island runs differ with {kwargs}"
+
+
+def migration_size(n_agents=100, migrants=2, seed=0):
+    # bytes on the queue per migration message, codon rows vs the pickled Genome objects
+    model = SwarmModel(n_agents=n_agents, seed=seed)
+    model.step()
+    codons = emigrants(model, migrants)
+    genomes = [a.genome for a in list(model.agents)[:migrants]]
+    try:
+        genome_bytes = len(pickle.dumps(genomes))
+    except Exception:
+        genome_bytes = None
+    return len(pickle.dumps((0, 0, codons))), genome_bytes
+
+
+def scaling(islands=(1, 2, 4), n_agents=30, steps=50, interval=10):
+    results = {}
+    for n_islands in islands:
+        for topology in ("ring", "full"):
+            start = time.perf_counter()
+            run_islands(n_islands=n_islands, topology=topology, interval=interval, n_agents=n_agents, steps=steps)
+            results[(n_islands, topology)] = time.perf_counter() - start
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    for topology in ("ring", "full"):
+        check_reproducible(n_islands=3, topology=topology, interval=5, n_agents=15, steps=20, seed=1)
+    print("island checks passed")
+    codon_bytes, genome_bytes = migration_size()
+    print(f"migration message: {codon_bytes} bytes as codons, "
+          f"{genome_bytes if genome_bytes is not None else 'unpicklable'} as Genome objects")
+    for (n_islands, topology), seconds in scaling().items():
+        print(f"{n_islands} islands, {topology:4}: {seconds:7.2f} s")
@@ -0,0 +1,73 @@
+import random
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import moving_template
+from environment.swarm_model import ENGINES, SwarmModel
+from environment.utils import *
+
+
+def _scan(model):
+    # the full scans the counters replace
+    maintenance = sum(1 for d in model.debris if dist(d.pos, model.hub.pos) > model.hub.debris_boundary)
+    foraging = sum(1 for f in model.food if dist(f.pos, model.hub.pos) <= model.hub.radius)
+    return (maintenance / len(model.debris) if model.debris else np.nan,
+            foraging / len(model.food) if model.food else np.nan)
+
+
+def check_counters(steps=60, n_agents=40, seed=0, engine="reference", n_food=30, n_debris=30):
+    # no evolved tree picks anything up, so agents are handed objects and told to drop them from outside the tick
+    random.seed(seed)
+    model = SwarmModel(n_agents=n_agents, n_food=n_food, n_debris=n_debris, seed=seed, engine=engine,
+                       template_genome=moving_template(seed))
+    rng = random.Random(seed)
+    for step in range(steps):
+        for agent in sorted(model.agents, key=lambda a: a.unique_id):
+            if agent.carrying is None and rng.random() < 0.2:
+                available = [o for o in model.food + model.debris if not o.picked_up]
+                if available:
+                    obj = rng.choice(available)
+                    agent.pos = obj.pos.copy()
+                    assert agent.pickup(obj)
+            elif agent.carrying is not None and rng.random() < 0.1:
+                if rng.random() < 0.5:
+                    agent.pos = model.hub.pos.copy()
+                assert agent.drop(agent.carrying.type)
+        model.step()
+        expected = _scan(model)
+        # the fractions of an empty object list are undefined, the recorded metrics hold nan for them
+        if n_food and n_debris:
+            assert (model.debris_removed_fraction(), model.food_at_hub_fraction()) == expected, \
+                f"counters differ from the scan at step {step} with {engine}"
+        assert np.array_equal(model.metric_series()[-1], expected, equal_nan=True), \
+            f"recorded metrics differ from the scan at step {step} with {engine}"
+
+
+def timing(counts=(100, 1000, 10000), rounds=100, seed=0):
+    results = {}
+    for n in counts:
+        random.seed(seed)
+        model = SwarmModel(n_agents=1, n_food=n, n_debris=n, seed=seed)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            _scan(model)
+        scan_time = (time.perf_counter() - start) / rounds
+        start = time.perf_counter()
+        for _ in range(rounds):
+            model.debris_removed_fraction(), model.food_at_hub_fraction()
+        results[n] = (scan_time, (time.perf_counter() - start) / rounds)
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    for engine in ENGINES:
+        check_counters(engine=engine)
+        check_counters(seed=1, engine=engine)
+        check_counters(engine=engine, n_food=0)
+        check_counters(engine=engine, n_debris=0)
+    print("counter checks passed")
+    for n, (scan_time, counter_time) in timing().items():
+        print(f"{n:6} food + {n:6} debris: scan {scan_time * 1e6:10.1f} us, counters {counter_time * 1e6:6.2f} us")
@@ -0,0 +1,50 @@
+import random
+import time
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.spatial import SpatialGrid
+from environment.utils import *
+
+
+class _Point:
+    def __init__(self, pos):
+        self.pos = pos
+
+
+def brute_force(points, radius):
+    return [[p for p in points if p is not q and dist(q.pos, p.pos) <= radius] for q in points]
+
+
+def grid_search(grid, points, radius):
+    return [[p for p in grid.within(q.pos, radius) if p is not q] for q in points]
+
+
+def run(agent_counts=(100, 500, 1000, 2000, 5000), radius=GENOME_EXCHANGE_RADIUS, world_size=ENV_SIZE, seed=0):
+    random.seed(seed)
+    rows = []
+    for n in agent_counts:
+        points = [_Point(np.array([random.uniform(-world_size, world_size), random.uniform(-world_size, world_size)]))
+                  for _ in range(n)]
+        grid = SpatialGrid(radius)
+        for p in points:
+            grid.insert(p)
+
+        start = time.perf_counter()
+        expected = brute_force(points, radius)
+        brute_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = grid_search(grid, points, radius)
+        grid_time = time.perf_counter() - start
+
+        assert found == expected, f"grid query differs from brute force for n={n}"
+        rows.append((n, brute_time, grid_time))
+    return rows
+
+
+if __name__ == '__main__':
+    print(f"{'agents':>8} {'brute [s/step]':>16} {'grid [s/step]':>16} {'speedup':>8}")
+    for n, brute_time, grid_time in run():
+        print(f"{n:>8} {brute_time:>16.4f} {grid_time:>16.4f} {brute_time / grid_time:>8.1f}")
@@ -0,0 +1,96 @@
+import random
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.movement import distances
+from environment.objects import Debris, Food, ObjectStore
+from environment.spatial import ObjectGrid, SpatialGrid
+from environment.utils import *
+
+
+class _DictObject:
+    # the objects before the store: an instance __dict__ and a tuple pos each
+    def __init__(self, pos):
+        self.pos = pos
+        self.picked_up = False
+
+
+def check_nearest(n=400, queries=500, seed=0):
+    # ObjectGrid must answer like the item by item SpatialGrid, ties and removed objects included
+    rng = random.Random(seed)
+    store = ObjectStore(n)
+    objects = [Food(store, i, (rng.uniform(-8, 8), rng.uniform(-8, 8))) for i in range(n)]
+    # duplicated positions, so equal distances have to go to the lowest rank
+    for i in range(0, n, 7):
+        objects[i].pos = objects[i // 2].pos
+    plain, grid = SpatialGrid(OBJECT_GRID_CELL_SIZE), ObjectGrid(OBJECT_GRID_CELL_SIZE, store)
+    for obj in objects:
+        plain.insert(obj)
+        grid.insert(obj)
+    for i in range(queries):
+        if i % 5 == 0:
+            obj = rng.choice(objects)
+            if obj in plain:
+                plain.remove(obj)
+                grid.remove(obj)
+            else:
+                obj.pos = (rng.uniform(-20, 20), rng.uniform(-20, 20))
+                plain.insert(obj)
+                grid.insert(obj)
+        pos = np.array([rng.uniform(-30, 30), rng.uniform(-30, 30)])
+        assert plain.nearest(pos) is grid.nearest(pos), f"nearest differs at query {i}"
+
+
+def memory(counts=(1000, 10000, 100000)):
+    # bytes per Food/Debris, dict objects with tuple positions vs handles to store rows
+    results = {}
+    for n in counts:
+        rng = random.Random(0)
+        points = [(rng.uniform(-8, 8), rng.uniform(-8, 8)) for _ in range(n)]
+        tracemalloc.start()
+        before = [_DictObject((np.float64(x), np.float64(y))) for x, y in points]
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del before
+        tracemalloc.start()
+        store = ObjectStore(n)
+        after = [Debris(store, i, pos) for i, pos in enumerate(points)]
+        store_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del after
+        results[n] = (dict_bytes / n, store_bytes / n)
+    return results
+
+
+def bulk_distances(n=100000, rounds=5):
+    # distance of every object to the hub, object by object vs over the store
+    rng = random.Random(0)
+    store = ObjectStore(n)
+    objects = [Debris(store, i, (rng.uniform(-8, 8), rng.uniform(-8, 8))) for i in range(n)]
+    hub = np.zeros(2)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        each = [dist(o.pos, hub) for o in objects]
+    loop = (time.perf_counter() - start) / rounds
+    start = time.perf_counter()
+    for _ in range(rounds):
+        bulk = distances(store.pos, hub)
+    vectorized = (time.perf_counter() - start) / rounds
+    assert np.array_equal(bulk, each)
+    return loop, vectorized
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_nearest()
+    check_nearest(n=50, seed=1)
+    print("nearest checks passed")
+    for n, (dict_bytes, store_bytes) in memory().items():
+        print(f"{n:7} objects: {dict_bytes:6.0f} B/object as dict objects, {store_bytes:6.0f} B/object in the store")
+    loop, vectorized = bulk_distances()
+    print(f"distances of 100000 objects to the hub: {loop * 1000:.1f} ms object by object, "
+          f"{vectorized * 1000:.2f} ms over the store")
@@ -0,0 +1,64 @@
+import random
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import moving_template
+from environment.partitioned import PartitionAgent, PartitionedSwarm
+
+
+class _CarryingAgent(PartitionAgent):
+    # no evolved tree picks anything up, so after its tick an agent drops what it carries or claims the nearest
+    # object in reach, drawing from the stream act() was reseeded with
+    def act(self):
+        super().act()
+        if self.carrying is not None:
+            if random.random() < 0.5:
+                assert self.drop(self.carrying.type)
+            return
+        for obj_type in ("Debris", "Food"):
+            obj = self.model.object_index[obj_type].nearest(self.pos)
+            if obj is not None and self.pickup(obj):
+                return
+
+
+def _run(n_workers, steps, carry=False, **kwargs):
+    agent_class = _CarryingAgent if carry else PartitionAgent
+    with PartitionedSwarm(n_workers=n_workers, agent_class=agent_class, **kwargs) as swarm:
+        swarm.step(steps)
+        return (swarm.positions(), swarm.world.object_pos.copy(), swarm.world.object_picked.copy(),
+                swarm.genomes(), swarm.food_at_hub_fraction(), swarm.debris_removed_fraction())
+
+
+def check_workers(workers=(1, 2, 4), steps=10, carry=False, **kwargs):
+    # a run may only depend on the seed, not on how the agents are partitioned
+    reference = _run(workers[0], steps, carry, **kwargs)
+    if carry:
+        assert reference[2].any(), "no object was picked up"
+    for n_workers in workers[1:]:
+        result = _run(n_workers, steps, carry, **kwargs)
+        same = all(np.array_equal(a, b, equal_nan=True) for a, b in zip(reference[:3], result[:3]))
+        assert same and reference[3:] == result[3:], f"{n_workers} workers differ from {workers[0]} with {kwargs}"
+
+
+def scaling(workers=(1, 2, 4, 8), n_agents=20000, steps=5, seed=1):
+    template = moving_template(seed)
+    results = {}
+    for n_workers in workers:
+        with PartitionedSwarm(n_agents=n_agents, n_workers=n_workers, template_genome=template, seed=seed) as swarm:
+            swarm.step()
+            start = time.perf_counter()
+            swarm.step(steps)
+            results[n_workers] = (time.perf_counter() - start) / steps
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_workers(n_agents=60, n_food=20, n_debris=20, seed=0)
+    check_workers(n_agents=500, template_genome=moving_template(2), seed=2)
+    check_workers(n_agents=200, n_food=40, n_debris=200, seed=3, steps=20, carry=True)
+    print("partitioning checks passed")
+    for n_workers, seconds in scaling().items():
+        print(f"{n_workers} workers: {seconds * 1000:9.1f} ms/step")
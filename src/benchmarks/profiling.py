@@ -0,0 +1,81 @@
+import random
+import sys
+import time
+import warnings
+
+from benchmarks.common import moving_template
+from environment.profiling import StepProfiler
+from environment.swarm_model import SwarmModel
+
+
+def _model(n_agents, seed, bt_backend):
+    random.seed(seed)
+    model = SwarmModel(n_agents=n_agents, seed=seed, bt_backend=bt_backend)
+    model.step()
+    return model
+
+
+def _time_steps(model, steps):
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.step()
+    return (time.perf_counter() - start) / steps
+
+
+def check_isolation(n_agents=30, steps=5, seed=0):
+    # only the attached model's calls are counted, and attaching leaves other models' decision tables alone
+    template, other_template = moving_template(3), moving_template(4)
+
+    def profiled(other=None):
+        random.seed(seed)
+        model = SwarmModel(n_agents=n_agents, seed=seed, template_genome=template, bt_backend="decision",
+                           rng_mode="streams")
+        tables = [] if other is None else [a.genome._phenotype.decision_tree().table for a in other.agents]
+        sizes = [len(table) for table in tables]
+        with StepProfiler().attach(model) as profiler:
+            assert [len(table) for table in tables] == sizes, "attach() cleared another model's decision tables"
+            for _ in range(steps):
+                model.step()
+                if other is not None:
+                    other.step()
+        return profiler
+
+    other = SwarmModel(n_agents=n_agents, seed=seed + 1, template_genome=other_template, bt_backend="decision",
+                       rng_mode="streams")
+    for _ in range(3):
+        other.step()
+    alone, shared = profiled(), profiled(other)
+    assert alone.keys() == shared.keys(), "another model's calls were counted"
+    for key in alone.keys():
+        assert (alone.per_step(key)[1] == shared.per_step(key)[1]).all(), f"another model's {key} calls were counted"
+
+
+def overhead(n_agents=100, steps=20, seed=0, bt_backend="bytecode"):
+    # ms/step while a profiler is attached and after it was detached again, each against the same steps of a run
+    # that was never profiled (the runs are identical, profiling does not change them)
+    plain = _model(n_agents, seed, bt_backend)
+    model = _model(n_agents, seed, bt_backend)
+    results = {"never attached": _time_steps(plain, steps)}
+    profiler = StepProfiler().attach(model)
+    results["attached"] = _time_steps(model, steps)
+    profiler.detach()
+    assert any(key.startswith("node:") for key in profiler.keys()), "no BT leaf was timed"
+    results["never attached, later steps"] = _time_steps(plain, steps)
+    results["detached"] = _time_steps(model, steps)
+    return results, profiler
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_isolation()
+    print("profiler checks passed")
+    results, profiler = overhead()
+    for name, seconds in results.items():
+        print(f"{name:>28}: {seconds * 1000:8.2f} ms/step")
+    path = sys.argv[1] if len(sys.argv) > 1 else "profile.json"
+    profiler.save(path)
+    summary = profiler.summary()
+    print(f"\nprofile written to {path}, slowest entries:")
+    for key in sorted(summary, key=lambda k: summary[k]["total"], reverse=True)[:10]:
+        calls = summary[key].get("calls", len(profiler.series))
+        print(f"{key:>32}: {summary[key]['total'] * 1000:8.2f} ms over {calls} calls")
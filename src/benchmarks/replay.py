@@ -0,0 +1,98 @@
+import random
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import moving_template
+from betr_geese.config import *
+from environment.events import EventLog, Replay, world_arrays
+from environment.swarm_model import ENGINES, SwarmModel
+from environment.utils import *
+
+
+def _truth(model):
+    world = world_arrays(model, sorted(model.agents, key=lambda a: a.unique_id))
+    world["metrics"] = (model.debris_removed_fraction(), model.food_at_hub_fraction())
+    return world
+
+
+def _matches(replay, truth):
+    return (np.array_equal(replay.pos, truth["pos"], equal_nan=True)
+            and np.array_equal(replay.carrying, truth["carrying"])
+            and np.array_equal(replay.object_pos, truth["object_pos"], equal_nan=True)
+            and np.array_equal(replay.picked, truth["picked"])
+            and np.array_equal(replay.genomes, truth["genomes"])
+            and replay.metrics() == truth["metrics"])
+
+
+def check_replay(steps=120, n_agents=30, seed=0, engine="reference", template=None, carry=False,
+                 keyframe_interval=25):
+    random.seed(seed)
+    model = SwarmModel(n_agents=n_agents, n_food=30, n_debris=30, seed=seed, engine=engine, template_genome=template)
+    log = EventLog(keyframe_interval).attach(model)
+    truth = [_truth(model)]
+    rng = random.Random(seed)
+    carried = 0
+    for _ in range(steps):
+        if carry:
+            # no evolved tree picks anything up, agents are told to pick up objects in reach and drop them from
+            # outside the tick
+            for agent in sorted(model.agents, key=lambda a: a.unique_id):
+                if agent.carrying is None and rng.random() < 0.5:
+                    reach = [o for o in model.food + model.debris
+                             if not o.picked_up and dist(agent.pos, o.pos) <= AGENT_SPEED]
+                    if reach:
+                        carried += agent.pickup(rng.choice(reach))
+                elif agent.carrying is not None and rng.random() < 0.1:
+                    assert agent.drop(agent.carrying.type)
+        model.step()
+        truth.append(_truth(model))
+    log.detach()
+    assert not carry or carried, "nothing was picked up"
+
+    replay = Replay(log.arrays())
+    # forward through every step, then jumps in both directions
+    for step in range(steps + 1):
+        assert _matches(replay.seek(step), truth[step]), f"replay differs at step {step} ({engine})"
+    for step in random.Random(seed).sample(range(steps + 1), 20):
+        assert _matches(replay.seek(step), truth[step]), f"replay differs after seeking to {step} ({engine})"
+
+
+def timing(steps=250, n_agents=100, seed=0):
+    # simulating a run vs replaying all of it from the first keyframe vs seeking its last step from the keyframe
+    # before it
+    random.seed(seed)
+    model = SwarmModel(n_agents=n_agents, seed=seed)
+    log = EventLog().attach(model)
+    start = time.perf_counter()
+    for _ in range(steps):
+        model.step()
+    simulate = time.perf_counter() - start
+    log.detach()
+    arrays = log.arrays()
+    first_only = {name: value[:1] if name.startswith("keyframe_") else value for name, value in arrays.items()}
+
+    replay = Replay(first_only)
+    start = time.perf_counter()
+    replay.seek(steps)
+    full = time.perf_counter() - start
+    replay = Replay(arrays)
+    start = time.perf_counter()
+    replay.seek(steps)
+    seek = time.perf_counter() - start
+    size = sum(a.nbytes for a in arrays.values())
+    return simulate, full, seek, size
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    for engine in ENGINES:
+        check_replay(engine=engine)
+        check_replay(seed=1, engine=engine, template=moving_template(1))
+        check_replay(seed=2, engine=engine, template=moving_template(2), carry=True)
+        check_replay(seed=3, engine=engine, carry=True, keyframe_interval=7)
+    print("replay checks passed")
+    simulate, full, seek, size = timing()
+    print(f"250 steps, 100 agents: simulate {simulate:.2f} s, replay {full * 1000:.1f} ms, "
+          f"seek to step 250 from its keyframe {seek * 1000:.1f} ms, log {size / 1e6:.2f} MB")
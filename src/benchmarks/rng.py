@@ -0,0 +1,77 @@
+import random
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import check_engines, check_resume, moving_template, same, snapshot
+from environment.rng import RandomStream
+from environment.swarm_model import SwarmModel
+
+
+def _run(steps=15, global_seed=0, **kwargs):
+    random.seed(global_seed)
+    model = SwarmModel(rng_mode="streams", **kwargs)
+    snapshots = []
+    for _ in range(steps):
+        model.step()
+        snapshots.append(snapshot(model))
+    return snapshots
+
+
+def check_streams(seed=0):
+    # a streams run only depends on its seed, not on the random module
+    first = _run(n_agents=30, n_food=20, n_debris=20, seed=seed, global_seed=1)
+    second = _run(n_agents=30, n_food=20, n_debris=20, seed=seed, global_seed=2)
+    assert all(same(a, b) for a, b in zip(first, second)), "streams run depends on the random module"
+    # an agent's stream only depends on its creation index, more agents don't change the first ones' draws
+    few = SwarmModel(n_agents=10, seed=seed, rng_mode="streams")
+    many = SwarmModel(n_agents=40, seed=seed, rng_mode="streams")
+    agents = sorted(many.agents, key=lambda a: a.unique_id)[:10]
+    for a, b in zip(sorted(few.agents, key=lambda a: a.unique_id), agents):
+        assert a.genome.genome == b.genome.genome
+        assert [a.stream.random() for _ in range(200)] == [b.stream.random() for _ in range(200)]
+
+
+def draws(count=1000000):
+    # seconds per draw, the random module vs a RandomStream
+    stream = RandomStream(np.random.SeedSequence(0))
+    results = {}
+    for name, source in (("random module", random), ("stream", stream)):
+        start = time.perf_counter()
+        for _ in range(count):
+            source.random()
+        results[(name, "random")] = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for _ in range(count):
+            source.uniform(0, 6.283185307179586)
+        results[(name, "uniform")] = (time.perf_counter() - start) / count
+    return results
+
+
+def steps(n_agents=100, steps=10, seed=0):
+    results = {}
+    for rng_mode in ("global", "streams"):
+        random.seed(seed)
+        model = SwarmModel(n_agents=n_agents, seed=seed, bt_backend="decision", rng_mode=rng_mode)
+        model.step()
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        results[rng_mode] = (time.perf_counter() - start) / steps
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_streams()
+    check_engines(n_agents=40, n_food=20, n_debris=20, rng_mode="streams")
+    check_engines(n_agents=100, template_genome=moving_template(3), bt_backend="flyweight", seed=3,
+                  rng_mode="streams")
+    check_resume(n_agents=30, n_food=20, n_debris=20, rng_mode="streams")
+    check_resume(n_agents=30, engine="vectorized", bt_backend="decision", seed=1, rng_mode="streams", cut=5)
+    print("stream checks passed")
+    for (name, call), seconds in draws().items():
+        print(f"{name:>14} {call:>8}(): {seconds * 1e9:6.1f} ns")
+    for rng_mode, seconds in steps().items():
+        print(f"{rng_mode:>8}: {seconds * 1000:8.3f} ms/step, 100 evolving agents")
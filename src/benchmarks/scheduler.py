@@ -0,0 +1,95 @@
+import random
+import time
+import warnings
+
+import mesa
+
+from benchmarks.common import check_engines, check_resume, moving_template, same, snapshot
+from environment.profiling import StepProfiler
+from environment.scheduler import ArrayScheduler
+from environment.swarm_model import ENGINES, SwarmModel
+
+
+class _Idle(mesa.Agent):
+    # nothing but the dispatch
+    def sense(self):
+        pass
+
+
+def _run(steps, seed, scheduler, **kwargs):
+    random.seed(seed)
+    model = SwarmModel(seed=seed, scheduler=scheduler, **kwargs)
+    snapshots = []
+    for _ in range(steps):
+        model.step()
+        snapshots.append(snapshot(model))
+    return model, snapshots
+
+
+def check_order(steps=30, seed=0, **kwargs):
+    # the ArrayScheduler must activate the agents in the order mesa does, and leave model.random where mesa does
+    for engine in ENGINES:
+        mesa_model, mesa_run = _run(steps, seed, "mesa", engine=engine, **kwargs)
+        array_model, array_run = _run(steps, seed, "array", engine=engine, **kwargs)
+        for step, (a, b) in enumerate(zip(mesa_run, array_run)):
+            assert same(a, b), f"schedulers diverge at step {step} on {engine} with {kwargs}"
+        assert mesa_model.random.getstate() == array_model.random.getstate()
+
+
+def check_profiled(steps=5, seed=0):
+    # phases are timed under the same keys with either scheduler
+    keys = []
+    for scheduler in ("mesa", "array"):
+        model = SwarmModel(n_agents=20, seed=seed, scheduler=scheduler)
+        with StepProfiler().attach(model) as profiler:
+            for _ in range(steps):
+                model.step()
+        keys.append({key for key in profiler.keys() if key.startswith("phase:")})
+    assert keys[0] == keys[1] == {"phase:sense", "phase:act", "phase:update"}, keys
+
+
+def dispatch(sizes=(1000, 10000), rounds=20):
+    # seconds per phase over agents that do nothing, the scheduling overhead alone
+    results = {}
+    for n in sizes:
+        model = mesa.Model(seed=0)
+        for _ in range(n):
+            _Idle(model)
+        array = ArrayScheduler(model)
+        for name, agents in (("mesa", model.agents), ("array", array)):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                agents.shuffle_do("sense")
+            results[(n, name)] = (time.perf_counter() - start) / rounds
+    return results
+
+
+def steps(n_agents=1000, steps=5, seed=1):
+    # ms/step of the vectorized engine with moving fixed genomes, where scheduling is a larger share of a step
+    template = moving_template(3)
+    results = {}
+    for scheduler in ("mesa", "array"):
+        random.seed(seed)
+        model = SwarmModel(n_agents=n_agents, seed=seed, template_genome=template, bt_backend="decision",
+                           engine="vectorized", scheduler=scheduler)
+        model.step()
+        start = time.perf_counter()
+        for _ in range(steps):
+            model.step()
+        results[scheduler] = (time.perf_counter() - start) / steps
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_order(n_agents=30, n_food=20, n_debris=20)
+    check_order(n_agents=60, template_genome=moving_template(3), bt_backend="flyweight", seed=3)
+    check_order(n_agents=30, n_food=20, n_debris=20, rng_mode="streams", seed=2)
+    check_engines(n_agents=40, n_food=20, n_debris=20, scheduler="array")
+    check_resume(n_agents=30, n_food=20, n_debris=20, scheduler="array")
+    check_profiled()
+    print("scheduler checks passed")
+    for (n, name), seconds in dispatch().items():
+        print(f"{n:6} idle agents, {name:>5}: {seconds * 1000:7.3f} ms/phase")
+    for scheduler, seconds in steps().items():
+        print(f"{scheduler:>5}: {seconds * 1000:8.3f} ms/step, 1000 agents, vectorized engine")
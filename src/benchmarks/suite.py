@@ -0,0 +1,240 @@
+import argparse
+import contextlib
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import moving_template
+from betr_geese.config import *
+from environment.genotype_to_phenotype import calculate_fitness, expand, phenotype_cache
+from environment.swarm_agent import Genome
+from environment.swarm_model import SwarmModel
+from environment.telemetry import TelemetryRecorder
+
+# Fixed seed scenarios timed against the current tree. Every result is the best of REPEATS runs in seconds per
+# operation (a step, a call), written as JSON. Given a baseline written by an earlier run, any result more than
+# the threshold slower than it is a regression and the suite exits with 1.
+
+REPEATS = 3
+_PACKAGES = ("environment.", "behaviour_trees.", "betr_geese.", "evolution.")
+
+
+@contextlib.contextmanager
+def _configured(**values):
+    # config constants are star imported, so set them in every module of ours that holds one
+    modules = [m for name, m in list(sys.modules.items()) if name.startswith(_PACKAGES)]
+    saved = [(m, k, getattr(m, k)) for m in modules for k in values if hasattr(m, k)]
+    for module, key, _ in saved:
+        setattr(module, key, values[key])
+    # derivations depend on MAX_TREE_DEPTH, the cache is keyed on the codons only
+    phenotype_cache.clear()
+    try:
+        yield
+    finally:
+        for module, key, value in saved:
+            setattr(module, key, value)
+        phenotype_cache.clear()
+
+
+def _best(run, repeats=REPEATS):
+    # run() times itself and returns (seconds, operations)
+    best = None
+    for _ in range(repeats):
+        seconds, operations = run()
+        best = seconds / operations if best is None else min(best, seconds / operations)
+    return best
+
+
+def _model(seed=0, **kwargs):
+    random.seed(seed)
+    return SwarmModel(seed=seed, **kwargs)
+
+
+def _steps(steps=5, warmup=1, seed=0, telemetry=False, **kwargs):
+    def run():
+        model = _model(seed, **kwargs)
+        with tempfile.TemporaryDirectory() as directory:
+            if telemetry:
+                TelemetryRecorder(directory, len(model.agents), warmup + steps).attach(model)
+            for _ in range(warmup):
+                model.step()
+            start = time.perf_counter()
+            for _ in range(steps):
+                model.step()
+            elapsed = time.perf_counter() - start
+            if model.recorder is not None:
+                model.recorder.close()
+        return elapsed, steps
+
+    return _best(run)
+
+
+# region Scenarios
+def step_vs_agents(counts=(100, 300, 1000), template=None):
+    # a fixed genome that moves, evolving swarms are quadratic in the genome exchange at the hub
+    template = template or moving_template(1)
+    return {f"step/template/agents={n}": _steps(n_agents=n, template_genome=template, bt_backend="decision")
+            for n in counts}
+
+
+def step_evolving(counts=(25, 50, 100)):
+    return {f"step/evolving/agents={n}": _steps(n_agents=n) for n in counts}
+
+
+def step_vs_objects(counts=(50, 200, 800), n_agents=100, template=None):
+    template = template or moving_template(1)
+    return {f"step/template/objects={n}": _steps(n_agents=n_agents, n_food=n, n_debris=n, template_genome=template,
+                                                 bt_backend="decision") for n in counts}
+
+
+def step_vs_genome(sizes=(10, 40, 160), depths=(5, 10, 20), n_agents=50):
+    results = {}
+    for size in sizes:
+        with _configured(GENOME_SIZE=size):
+            results[f"step/evolving/genome_size={size}"] = _steps(n_agents=n_agents)
+    for depth in depths:
+        with _configured(MAX_TREE_DEPTH=depth):
+            results[f"step/evolving/max_tree_depth={depth}"] = _steps(n_agents=n_agents)
+    return results
+
+
+def step_telemetry(counts=(100, 1000), template=None):
+    # the same runs as step_vs_agents with a TelemetryRecorder attached, the difference is the recorder overhead
+    template = template or moving_template(1)
+    return {f"step/template/telemetry/agents={n}": _steps(n_agents=n, template_genome=template, bt_backend="decision",
+                                                          telemetry=True) for n in counts}
+
+
+def micro_expand(genomes=500, seed=0):
+    rng = random.Random(seed)
+    codons = [[rng.randint(0, 255) for _ in range(GENOME_SIZE)] for _ in range(genomes)]
+
+    def run():
+        start = time.perf_counter()
+        for genome in codons:
+            expand("root", genome, 0, None)
+        return time.perf_counter() - start, genomes
+
+    return {"micro/expand": _best(run)}
+
+
+def micro_fitness(genomes=500, seed=0):
+    rng = random.Random(seed)
+    pool = [Genome([rng.randint(0, 255) for _ in range(GENOME_SIZE)], None) for _ in range(genomes)]
+
+    def cached():
+        start = time.perf_counter()
+        for genome in pool:
+            calculate_fitness(genome)
+        return time.perf_counter() - start, genomes
+
+    def cold():
+        phenotype_cache.clear()
+        return cached()
+
+    return {"micro/calculate_fitness": _best(cached), "micro/calculate_fitness/cold": _best(cold)}
+
+
+def micro_share_genome(n_agents=100, seed=0):
+    # every agent at the hub shares with every other one
+    model = _model(seed, n_agents=n_agents)
+    agents = sorted(model.agents, key=lambda a: a.unique_id)
+
+    def run():
+        state = random.getstate()
+        start = time.perf_counter()
+        for agent in agents:
+            agent.share_genome()
+        elapsed = time.perf_counter() - start
+        random.setstate(state)
+        for agent in agents:
+            agent.genome_storage_pool.replace(agent.genome_storage_pool.codons[:1].copy())
+        return elapsed, len(agents)
+
+    return {f"micro/share_genome/agents={n_agents}": _best(run)}
+
+
+def micro_find_closest_objects(n_agents=100, steps=10, seed=0):
+    model = _model(seed, n_agents=n_agents, template_genome=moving_template(1))
+    for _ in range(steps):
+        model.step()
+    agents = list(model.agents)
+
+    def run():
+        start = time.perf_counter()
+        for agent in agents:
+            agent.find_closest_objects()
+        return time.perf_counter() - start, len(agents)
+
+    return {"micro/find_closest_objects": _best(run)}
+# endregion
+
+
+SCENARIOS = {
+    "agents": step_vs_agents,
+    "evolving": step_evolving,
+    "objects": step_vs_objects,
+    "genome": step_vs_genome,
+    "telemetry": step_telemetry,
+    "expand": micro_expand,
+    "fitness": micro_fitness,
+    "share_genome": micro_share_genome,
+    "find_closest_objects": micro_find_closest_objects,
+}
+
+
+def run_suite(names=None):
+    results = {}
+    for name in names or SCENARIOS:
+        results.update(SCENARIOS[name]())
+    return {"meta": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                     "processor": platform.processor(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+            "results": results}
+
+
+def compare(results, baseline, threshold=BENCH_REGRESSION_THRESHOLD):
+    # (name, baseline, current, ratio) of every result slower than baseline * (1 + threshold)
+    regressions = []
+    for name, seconds in results["results"].items():
+        before = baseline["results"].get(name)
+        if before and seconds > before * (1 + threshold):
+            regressions.append((name, before, seconds, seconds / before))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="fixed seed benchmark suite")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=BENCH_REGRESSION_THRESHOLD,
+                        help="allowed slowdown as a fraction of the baseline")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="run only these scenarios")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.only)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for name, seconds in results["results"].items():
+        print(f"{name:>40}: {seconds * 1000:10.4f} ms")
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, before, seconds, ratio in regressions:
+        print(f"REGRESSION {name}: {before * 1000:.4f} ms -> {seconds * 1000:.4f} ms ({ratio:.2f}x)")
+    if not regressions:
+        print(f"no regressions beyond {args.threshold:.0%} of {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    sys.exit(main())
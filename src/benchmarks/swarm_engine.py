@@ -0,0 +1,72 @@
+import random
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from benchmarks.common import check_engines, moving_template
+from betr_geese.config import *
+from environment.swarm_model import ENGINES, SwarmModel
+from environment.swarm_state import nearest_rows
+from environment.utils import *
+
+
+def check_nearest_blocks(n_queries=300, n_points=500, seed=0):
+    # the answer must not depend on how the queries are split into blocks, and must match min() over dist
+    rng = np.random.default_rng(seed)
+    queries = rng.uniform(-20, 20, (n_queries, 2))
+    points = rng.uniform(-20, 20, (n_points, 2))
+    points[::7] = points[3]
+    expected = [min(range(n_points), key=lambda i: dist(q, points[i])) for q in queries]
+    for budget in (1, n_points - 1, 3 * n_points + 1, 1 << 20):
+        assert nearest_rows(queries, points, budget).tolist() == expected, f"nearest rows differ with {budget}"
+
+
+def large_objects(n_agents=2000, n_objects=(10000, 40000, 100000), seed=0):
+    # sensing against many objects, peak memory allocated during one SwarmState.sense() and its time
+    results = {}
+    for n in n_objects:
+        random.seed(seed)
+        model = SwarmModel(n_agents=n_agents, n_food=n // 2, n_debris=n // 2, seed=seed, engine="vectorized",
+                           template_genome=moving_template(seed), bt_backend="decision")
+        tracemalloc.start()
+        start = time.perf_counter()
+        model.state.sense()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[n] = (peak, seconds)
+    return results
+
+
+def scaling(sizes=(100, 1000, 10000), steps=5, seed=1, bt_backend="decision"):
+    template = moving_template(seed)
+    results = {}
+    for n_agents in sizes:
+        for engine in ENGINES:
+            random.seed(seed)
+            model = SwarmModel(n_agents=n_agents, seed=seed, engine=engine, bt_backend=bt_backend,
+                               template_genome=template)
+            model.step()
+            start = time.perf_counter()
+            for _ in range(steps):
+                model.step()
+            results[(n_agents, engine)] = (time.perf_counter() - start) / steps
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    check_engines(n_agents=40, n_food=20, n_debris=20)
+    check_engines(n_agents=40, n_food=20, n_debris=20, bt_backend="decision", seed=1)
+    check_engines(n_agents=30, spatial_index=False, bt_backend="bytecode", seed=2)
+    check_engines(n_agents=200, template_genome=moving_template(3), bt_backend="flyweight", seed=3)
+    check_engines(n_agents=60, n_food=3000, n_debris=3000, template_genome=moving_template(4),
+                  bt_backend="decision", seed=4, steps=5)
+    check_nearest_blocks()
+    print("differential checks passed")
+    for n, (peak, seconds) in large_objects().items():
+        print(f"2000 agents x {n:6} objects: sense() peaks at {peak / 2 ** 20:6.1f} MiB, {seconds * 1000:8.1f} ms")
+    for (n_agents, engine), seconds in scaling().items():
+        print(f"{n_agents:>6} agents {engine:>10}: {seconds * 1000:9.1f} ms/step")
@@ -0,0 +1,87 @@
+import random
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks.common import moving_template
+from environment.swarm_model import ENGINES, SwarmModel
+from environment.telemetry import TelemetryRecorder, load_telemetry
+
+
+def _snapshot(model):
+    agents = sorted(model.agents, key=lambda a: a.unique_id)
+    objects = model.food + model.debris
+    return (np.array([a.pos for a in agents], dtype='float64'),
+            np.array([objects.index(a.carrying) if a.carrying is not None else -1 for a in agents]),
+            np.array([a.genome.fitness for a in agents]))
+
+
+def check_recorder(steps=30, stride=1, n_agents=30, seed=0, engine="reference", template=None):
+    # the files, read while the run is going, hold exactly what the model held at every recorded step
+    with tempfile.TemporaryDirectory() as directory:
+        random.seed(seed)
+        model = SwarmModel(n_agents=n_agents, seed=seed, engine=engine, template_genome=template)
+        recorder = TelemetryRecorder(directory, n_agents, steps, stride).attach(model)
+        expected = []
+        for step in range(1, steps + 1):
+            model.step()
+            if step % stride == 0:
+                expected.append(_snapshot(model))
+                live = load_telemetry(directory)
+                assert len(live["time"]) == len(expected) and live["time"][-1] == step
+                del live
+        recorder.close()
+        assert model.recorder is None
+
+        telemetry = load_telemetry(directory)
+        assert list(telemetry["time"]) == list(range(stride, steps + 1, stride))
+        for row, (positions, carrying, fitness) in enumerate(expected):
+            assert np.array_equal(telemetry["positions"][row], positions), f"positions differ at row {row} ({engine})"
+            assert np.array_equal(telemetry["carrying"][row], carrying)
+            assert np.array_equal(telemetry["fitness"][row], fitness)
+        assert np.array_equal(telemetry["metrics"], model.metric_series()[stride - 1::stride])
+        del telemetry
+
+        # a fresh run reusing the directory only reports its own rows, not the ones the run before left there
+        random.seed(seed)
+        model = SwarmModel(n_agents=n_agents, seed=seed, engine=engine, template_genome=template)
+        with TelemetryRecorder(directory, n_agents, steps, stride).attach(model):
+            assert len(load_telemetry(directory)["time"]) == 0
+            for _ in range(stride):
+                model.step()
+            assert list(load_telemetry(directory)["time"]) == [stride]
+
+
+def timing(steps=50, n_agents=100, strides=(1, 10), seed=0):
+    # ms/step of the same fixed genome run without and with a recorder
+    template = moving_template(1)
+
+    def run(stride=None):
+        random.seed(seed)
+        model = SwarmModel(n_agents=n_agents, seed=seed, template_genome=template, bt_backend="decision")
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = None if stride is None else TelemetryRecorder(directory, n_agents, steps, stride).attach(model)
+            start = time.perf_counter()
+            for _ in range(steps):
+                model.step()
+            elapsed = time.perf_counter() - start
+            if recorder is not None:
+                recorder.close()
+        return elapsed / steps
+
+    results = {"none": run()}
+    for stride in strides:
+        results[f"stride={stride}"] = run(stride)
+    return results
+
+
+if __name__ == '__main__':
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+    for engine in ENGINES:
+        check_recorder(engine=engine)
+        check_recorder(stride=4, seed=1, engine=engine, template=moving_template(1))
+    print("recorder checks passed")
+    for name, seconds in timing().items():
+        print(f"{name:>10}: {seconds * 1000:8.3f} ms/step")
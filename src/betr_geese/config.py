@@ -14,6 +14,23 @@ NEST_DEBRIS_BOUNDARY = 30
 AGENT_SPEED = 2
 GENOME_SIZE = 10
 GENOME_EXCHANGE_RADIUS = 5
+OBJECT_GRID_CELL_SIZE = 4
+PHENOTYPE_CACHE_SIZE = 4096
+DECISION_TABLE_SIZE = 256
+TRIAL_COUNT = 10
+TRIAL_SEED = 0
+ISLAND_TOPOLOGY = "ring"
+ISLAND_MIGRATION_INTERVAL = 100
+ISLAND_MIGRANTS = 2
+ISLAND_RECIPIENTS = 5
+CHECKPOINT_INTERVAL = 100
+PROFILE_HISTOGRAM_BINS = 20
+BENCH_REGRESSION_THRESHOLD = 0.25
+TELEMETRY_STRIDE = 1
+REPLAY_KEYFRAME_INTERVAL = 100
+CONVERGENCE_WINDOW = 100
+CONVERGENCE_TOLERANCE = 0.01
+CONVERGENCE_MIN_STEPS = 300
 
 ALL_BEHAVIOR_NODES = {
     # postconditions
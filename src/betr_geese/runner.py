@@ -0,0 +1,197 @@
+import json
+import os
+import random
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.convergence import ConvergenceMonitor
+from environment.swarm_agent import Genome
+from environment.swarm_model import SwarmModel
+from environment.events import EventLog
+from environment.telemetry import TelemetryRecorder
+
+
+def trial_seeds(trial_count, seed=TRIAL_SEED):
+    # independent (learning, testing) seeds per trial, trial t always gets the same pair for a given seed
+    children = np.random.SeedSequence(seed).spawn(trial_count)
+    return [tuple(int(s) for s in child.generate_state(2)) for child in children]
+
+
+def checkpoint_path(checkpoint_dir, trial, phase):
+    return None if checkpoint_dir is None else os.path.join(checkpoint_dir, f"trial_{trial}_{phase}.npz")
+
+
+def telemetry_path(telemetry_dir, trial, phase):
+    return None if telemetry_dir is None else os.path.join(telemetry_dir, f"trial_{trial}_{phase}")
+
+
+def event_log_path(event_dir, trial, phase):
+    return None if event_dir is None else os.path.join(event_dir, f"trial_{trial}_{phase}.npz")
+
+
+def _model(seed, path, n_agents, steps, template=None, bt_backend="py_trees"):
+    # resumes from the checkpoint an interrupted run with the same settings left at path, otherwise starts over
+    if path is not None and os.path.exists(path):
+        try:
+            model = SwarmModel.load_checkpoint(path, checkpoint_path=path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            model = None
+        expected = {"seed": seed, "n_agents": n_agents, "template_genome": template, "bt_backend": bt_backend}
+        if model is not None and model.time <= steps and all(model.params[k] == v for k, v in expected.items()):
+            return model
+    # agents draw from the global random module, so seed it along with the model
+    random.seed(seed)
+    return SwarmModel(n_agents=n_agents, template_genome=None if template is None else Genome(template, None),
+                      bt_backend=bt_backend, seed=seed, checkpoint_path=path)
+
+
+def _run(model, steps, telemetry=None, events=None, monitor=None):
+    # telemetry: directory to record the run's trajectories into, a resumed run keeps the rows recorded before
+    # events: where to save the run's EventLog, a resumed run's log starts where it resumed
+    # monitor: a ConvergenceMonitor that may end the run before steps
+    recorder = None if telemetry is None else TelemetryRecorder(telemetry, len(model.agents), steps).attach(model)
+    log = None if events is None else EventLog().attach(model)
+    if monitor is not None:
+        monitor.attach(model)
+    try:
+        # a run resumed from a checkpoint written at the step it converged has nothing left to do
+        while model.running and model.time < steps:
+            model.step()
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if log is not None:
+            log.detach()
+        if monitor is not None:
+            monitor.detach()
+    if log is not None:
+        os.makedirs(os.path.dirname(events) or ".", exist_ok=True)
+        log.save(events)
+    return model.debris_removed_fraction(), model.food_at_hub_fraction()
+
+
+def run_learning(trial, seed, n_agents=N_AGENTS, steps=STEPS, checkpoint_dir=None, telemetry_dir=None,
+                 event_dir=None, early_stopping=False):
+    # with early_stopping the run ends once a ConvergenceMonitor sees it converge, steps is the most it runs
+    model = _model(seed, checkpoint_path(checkpoint_dir, trial, "learning"), n_agents, steps)
+    monitor = ConvergenceMonitor() if early_stopping else None
+    maintenance, foraging = _run(model, steps, telemetry_path(telemetry_dir, trial, "learning"),
+                                 event_log_path(event_dir, trial, "learning"), monitor)
+
+    best_genome = None
+    for agent in model.agents:
+        if best_genome is None or best_genome.fitness < agent.genome.fitness:
+            best_genome = agent.genome
+    return {"trial": trial, "phase": "learning", "seed": seed, "n_agents": n_agents, "steps": steps,
+            "maintenance": maintenance, "foraging": foraging, "genome": list(best_genome.genome),
+            "early_stopping": early_stopping, "stop_step": model.time,
+            "stop_reason": None if monitor is None else monitor.reason}
+
+
+def run_testing(trial, seed, genome, n_agents=N_AGENTS, steps=STEPS, checkpoint_dir=None, telemetry_dir=None,
+                event_dir=None):
+    model = _model(seed, checkpoint_path(checkpoint_dir, trial, "testing"), n_agents, steps, genome,
+                   "flyweight")
+    maintenance, foraging = _run(model, steps, telemetry_path(telemetry_dir, trial, "testing"),
+                                 event_log_path(event_dir, trial, "testing"))
+    return {"trial": trial, "phase": "testing", "seed": seed, "n_agents": n_agents, "steps": steps,
+            "maintenance": maintenance, "foraging": foraging, "genome": genome}
+
+
+def load_results(path):
+    # finished phases from an earlier run, a line cut short by a crash is ignored
+    results = {}
+    if path is None or not os.path.exists(path):
+        return results
+    line = "\n"
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[(record["trial"], record["phase"])] = record
+    if not line.endswith("\n"):
+        # end the cut off line, or the next record would be appended to it
+        with open(path, "a") as f:
+            f.write("\n")
+    return results
+
+
+def _save(path, record):
+    if path is None:
+        return
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def run_trials(trial_count=TRIAL_COUNT, seed=TRIAL_SEED, workers=None, results_path=None, n_agents=N_AGENTS,
+               steps=STEPS, checkpoint_dir=None, telemetry_dir=None, event_dir=None, early_stopping=False):
+    # every trial's learning run and then its testing run on a process pool, results come back in trial order.
+    # Each finished phase is appended to results_path, and phases already in it with the same settings are reused.
+    # Runs still going are checkpointed to checkpoint_dir and pick up from there when run_trials is called again.
+    # With telemetry_dir every run records its trajectories into a directory of its own in there, with event_dir
+    # every run saves an EventLog to replay it with (environment.events.Replay) in there. With early_stopping the
+    # learning runs end once they converge, their records say at which step and why (stop_step, stop_reason).
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    seeds = trial_seeds(trial_count, seed)
+    done = load_results(results_path)
+
+    def finished(trial, phase):
+        record = done.get((trial, phase))
+        expected = seeds[trial][0 if phase == "learning" else 1]
+        if record is None or record.get("early_stopping", False) != (early_stopping and phase == "learning"):
+            return None
+        if (record["seed"], record["n_agents"], record["steps"]) == (expected, n_agents, steps):
+            return record
+        return None
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        pending = set()
+
+        def submit_testing(learning):
+            trial = learning["trial"]
+            record = finished(trial, "testing")
+            if record is not None and record["genome"] == learning["genome"]:
+                results[(trial, "testing")] = record
+            else:
+                pending.add(pool.submit(run_testing, trial, seeds[trial][1], learning["genome"], n_agents,
+                                         steps, checkpoint_dir, telemetry_dir, event_dir))
+
+        for trial in range(trial_count):
+            record = finished(trial, "learning")
+            if record is None:
+                pending.add(pool.submit(run_learning, trial, seeds[trial][0], n_agents, steps, checkpoint_dir,
+                                         telemetry_dir, event_dir, early_stopping))
+            else:
+                results[(trial, "learning")] = record
+                submit_testing(record)
+
+        while pending:
+            completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                record = future.result()
+                _save(results_path, record)
+                path = checkpoint_path(checkpoint_dir, record["trial"], record["phase"])
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+                results[(record["trial"], record["phase"])] = record
+                if record["phase"] == "learning":
+                    submit_testing(record)
+
+    return [(results[(trial, "learning")], results[(trial, "testing")]) for trial in range(trial_count)]
+
+
+def print_report(trials):
+    for learning, testing in trials:
+        print(f"Learning:\nMaintenance:{learning['maintenance']}\nForaging:{learning['foraging']}")
+        if learning.get("stop_reason") is not None:
+            print(f"Stopped at step {learning['stop_step']} ({learning['stop_reason']})")
+        print(f"\nTesting:\nMaintenance:{testing['maintenance']}\nForaging:{testing['foraging']}\n\n")
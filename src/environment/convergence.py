@@ -0,0 +1,86 @@
+import numpy as np
+
+from betr_geese.config import *
+from environment.metrics import METRIC_COLUMNS
+
+# Ends a run once it has stopped changing. After every step the monitor records the best and mean fitness of the
+# agents' genomes, the mean diversity of their genome storage pools and the task metrics. It sets model.running to
+# False once the mean of each of them over the last window steps is within tolerance of its mean over the window
+# before ("plateau", means because pool diversity keeps jittering as pools evolve), or once all food is at the
+# hub and all debris past the boundary ("solved"), never before min_steps. Whatever steps the model has to check
+# model.running (runner._run does). The recorded rows are saved in checkpoints, so a resumed run stops where the
+# uninterrupted one would have.
+
+STAT_COLUMNS = ("best_fitness", "mean_fitness", "pool_diversity") + METRIC_COLUMNS
+
+
+def population_stats(model):
+    # (best fitness, mean fitness, mean diversity of the non-empty genome storage pools)
+    fitness = np.array([a.genome.fitness for a in model.agents])
+    pools = [a.genome_storage_pool for a in model.agents if a._should_evolve and len(a.genome_storage_pool)]
+    diversity = float(np.mean([p.diversity[:len(p)].mean() for p in pools])) if pools else 0.0
+    return float(fitness.max()), float(fitness.mean()), diversity
+
+
+class ConvergenceMonitor:
+    def __init__(self, window=CONVERGENCE_WINDOW, tolerance=CONVERGENCE_TOLERANCE, min_steps=CONVERGENCE_MIN_STEPS):
+        self.window = window
+        self.tolerance = tolerance
+        self.min_steps = min_steps
+        self.times = []
+        self.rows = []
+        self.stop_step = None
+        self.reason = None
+        self._model = None
+
+    def attach(self, model):
+        if model.monitor_state is not None:
+            self.set_state(model.monitor_state)
+            model.monitor_state = None
+        self._model = model
+        model.monitor = self
+        return self
+
+    def detach(self):
+        if self._model is not None:
+            self._model.monitor = None
+            self._model = None
+
+    def end_step(self, model):
+        # called by SwarmModel.step() once the step's metrics are recorded
+        row = (*population_stats(model), *model.metrics[model.time - 1])
+        self.times.append(model.time)
+        self.rows.append(row)
+        if self.stop_step is not None or model.time < self.min_steps:
+            return
+        # a task metric is nan in a world without its objects, it can't keep the run going
+        metrics = np.array(row[3:])
+        if (np.isnan(metrics) | (metrics == 1)).all():
+            self._stop(model, "solved")
+        elif len(self.rows) >= 2 * self.window:
+            recent = np.array(self.rows[-2 * self.window:])
+            before, last = recent[:self.window].mean(axis=0), recent[self.window:].mean(axis=0)
+            if (np.isnan(last - before) | (np.abs(last - before) <= self.tolerance)).all():
+                self._stop(model, "plateau")
+
+    def _stop(self, model, reason):
+        self.stop_step = model.time
+        self.reason = reason
+        model.running = False
+
+    # region State
+    def get_state(self):
+        # JSON-able, floats round trip exactly
+        return {"times": self.times, "rows": [list(row) for row in self.rows], "stop_step": self.stop_step,
+                "reason": self.reason}
+
+    def set_state(self, state):
+        self.times = list(state["times"])
+        self.rows = [tuple(row) for row in state["rows"]]
+        self.stop_step = state["stop_step"]
+        self.reason = state["reason"]
+    # endregion
+
+    def series(self):
+        # steps and their STAT_COLUMNS
+        return np.array(self.times, dtype=np.int64), np.array(self.rows, dtype='float64').reshape(-1, len(STAT_COLUMNS))
@@ -0,0 +1,188 @@
+import numpy as np
+
+from betr_geese.config import *
+from environment.movement import *
+
+# What changes the world in a SwarmModel run, logged as it happens: every move an agent makes (explore moves by
+# the delta they drew, steering by the target), pickups, drops and genomes adopted in update(). A Replay applies
+# the events to keyframes of the world taken every keyframe_interval steps, so no tree is ticked and nothing
+# evolves, and seeking to a step only replays the steps since the keyframe before it.
+
+# event kinds after the move kinds, ref is the object row for pickups/drops and the codon row for adoptions
+PICKUP = 3
+DROP = 4
+ADOPT = 5
+
+EVENT_DTYPE = np.dtype([("agent", np.int32), ("kind", np.int8), ("ref", np.int32), ("x", np.float64),
+                        ("y", np.float64)])
+
+
+def world_arrays(model, agents):
+    # agents in unique_id order, objects in object store rows (model.food + model.debris)
+    return {
+        "pos": np.array([a.pos for a in agents], dtype='float64').reshape(-1, 2),
+        "carrying": np.array([-1 if a.carrying is None else a.carrying.row for a in agents], dtype=np.int32),
+        "object_pos": model.object_store.pos.copy(),
+        "picked": model.object_store.picked.copy(),
+        "genomes": np.array([a.genome.genome for a in agents], dtype=np.uint8),
+    }
+
+
+class EventLog:
+    def __init__(self, keyframe_interval=REPLAY_KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.start = None
+        self.chunks = []
+        self.codons = []
+        self.keyframes = {}
+        self.header = None
+        self._model = None
+        self._rows = None
+        self._step = []
+
+    def attach(self, model):
+        # the log starts with a keyframe of the world as it is now
+        agents = sorted(model.agents, key=lambda a: a.unique_id)
+        self._model = model
+        self._rows = {agent: i for i, agent in enumerate(agents)}
+        self.start = model.time
+        self.keyframes[model.time] = world_arrays(model, agents)
+        self.header = {"hub": np.array(model.hub.pos, dtype='float64'), "hub_radius": model.hub.radius,
+                       "debris_boundary": model.hub.debris_boundary, "n_food": len(model.food)}
+        model.event_log = self
+        return self
+
+    def detach(self):
+        if self._model is not None:
+            self._model.event_log = None
+            self._model = None
+
+    # region Logging
+    def move(self, agent, kind, x, y):
+        self._step.append((self._rows[agent], kind, -1, x, y))
+
+    def pickup(self, agent, obj):
+        self._step.append((self._rows[agent], PICKUP, obj.row, 0.0, 0.0))
+
+    def drop(self, agent, obj):
+        self._step.append((self._rows[agent], DROP, obj.row, 0.0, 0.0))
+
+    def adopt(self, agent, codons):
+        self._step.append((self._rows[agent], ADOPT, len(self.codons), 0.0, 0.0))
+        self.codons.append(np.array(codons, dtype=np.uint8))
+
+    def end_step(self, model):
+        # called by SwarmModel.step() once the step is done
+        self.chunks.append(np.array(self._step, dtype=EVENT_DTYPE))
+        self._step = []
+        if model.time % self.keyframe_interval == 0:
+            self.keyframes[model.time] = world_arrays(model, sorted(self._rows, key=lambda a: a.unique_id))
+    # endregion
+
+    def arrays(self):
+        steps = sorted(self.keyframes)
+        genome_size = self.keyframes[self.start]["genomes"].shape[1]
+        arrays = {
+            "start": np.array(self.start),
+            "offsets": np.concatenate([[0], np.cumsum([len(c) for c in self.chunks])]).astype(np.int64),
+            "events": np.concatenate(self.chunks) if self.chunks else np.zeros(0, EVENT_DTYPE),
+            "codons": np.array(self.codons, dtype=np.uint8).reshape(-1, genome_size),
+            "keyframe_steps": np.array(steps, dtype=np.int64),
+        }
+        for name in self.keyframes[self.start]:
+            arrays[f"keyframe_{name}"] = np.stack([self.keyframes[step][name] for step in steps])
+        for name, value in self.header.items():
+            arrays[f"header_{name}"] = np.asarray(value)
+        return arrays
+
+    def save(self, path):
+        np.savez_compressed(path, **self.arrays())
+
+
+def load_events(path):
+    with np.load(path) as data:
+        return dict(data)
+
+
+class Replay:
+    # the world of a logged run at any step in [start, end]
+    def __init__(self, log):
+        # log: EventLog.arrays() or load_events()
+        self.log = log
+        self.start = int(log["start"])
+        self.end = self.start + len(log["offsets"]) - 1
+        self.keyframe_steps = log["keyframe_steps"]
+        self.time = None
+        self._load_keyframe(0)
+
+    def _load_keyframe(self, k):
+        log = self.log
+        self.time = int(self.keyframe_steps[k])
+        self.pos = log["keyframe_pos"][k].copy()
+        self.carrying = log["keyframe_carrying"][k].copy()
+        self.object_pos = log["keyframe_object_pos"][k].copy()
+        self.picked = log["keyframe_picked"][k].copy()
+        self.genomes = log["keyframe_genomes"][k].copy()
+
+    def seek(self, step):
+        if not self.start <= step <= self.end:
+            raise ValueError(f"step {step} is outside the logged steps [{self.start}, {self.end}]")
+        k = int(np.searchsorted(self.keyframe_steps, step, side="right")) - 1
+        if step < self.time or self.keyframe_steps[k] > self.time:
+            self._load_keyframe(k)
+        while self.time < step:
+            self._apply(self.time - self.start)
+            self.time += 1
+        return self
+
+    def _apply(self, index):
+        events = self.log["events"][self.log["offsets"][index]:self.log["offsets"][index + 1]]
+        kinds = events["kind"]
+        if ((kinds == PICKUP) | (kinds == DROP)).any():
+            # objects change hands, keep the logged order across agents
+            for event in events:
+                self._apply_one(event)
+        else:
+            self._apply_moves(events[kinds <= AWAY])
+            for event in events[kinds == ADOPT]:
+                self.genomes[event["agent"]] = self.log["codons"][event["ref"]]
+        carriers = np.flatnonzero(self.carrying >= 0)
+        self.object_pos[self.carrying[carriers]] = self.pos[carriers]
+
+    def _apply_moves(self, moves):
+        # an agent's k-th move goes in wave k, like SwarmState.apply_queued()
+        if not len(moves):
+            return
+        order = np.argsort(moves["agent"], kind="stable")
+        agents = moves["agent"][order]
+        first = np.concatenate([[True], agents[1:] != agents[:-1]])
+        index = np.arange(len(agents))
+        waves = index - np.maximum.accumulate(np.where(first, index, 0))
+        for wave in range(waves.max() + 1):
+            batch = moves[order[waves == wave]]
+            apply_moves(self.pos, batch["agent"], batch["kind"], batch["x"], batch["y"])
+
+    def _apply_one(self, event):
+        agent, kind, ref = event["agent"], event["kind"], event["ref"]
+        if kind <= AWAY:
+            apply_moves(self.pos, np.array([agent]), np.array([kind]), np.array([event["x"]]),
+                        np.array([event["y"]]))
+        elif kind == PICKUP:
+            self.pos[agent] = self.object_pos[ref]
+            self.carrying[agent] = ref
+            self.picked[ref] = True
+        elif kind == DROP:
+            self.object_pos[ref] = self.pos[agent]
+            self.carrying[agent] = -1
+            self.picked[ref] = False
+        else:
+            self.genomes[agent] = self.log["codons"][ref]
+
+    def metrics(self):
+        # (maintenance, foraging) with the predicates of ObjectMetrics
+        log = self.log
+        d = distances(self.object_pos, log["header_hub"])
+        n_food = int(log["header_n_food"])
+        foraging = np.count_nonzero(d[:n_food] <= log["header_hub_radius"]) / n_food
+        maintenance = np.count_nonzero(d[n_food:] > log["header_debris_boundary"]) / (len(d) - n_food)
+        return maintenance, foraging
@@ -0,0 +1,91 @@
+import numpy as np
+
+from betr_geese.config import *
+from environment.genotype_to_phenotype import diversity_from_signature, phenotype_cache
+
+
+class GenomePool:
+    # an agent's genome storage pool as a uint8 codon matrix, one row per genome with its fitness and diversity
+    # alongside. Rows only become Genomes, and so trees, when the agent adopts one.
+    def __init__(self, genome_size=GENOME_SIZE, capacity=STORAGE_THRESHOLD + 1):
+        self.codons = np.zeros((capacity, genome_size), dtype=np.uint8)
+        self.fitness = np.zeros(capacity)
+        self.diversity = np.zeros(capacity)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self.codons))
+        for name in ("codons", "fitness", "diversity"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, codons):
+        if self._size == len(self.codons):
+            self._grow(self._size + 1)
+        row = self._size
+        self.codons[row] = codons
+        phenotype = phenotype_cache.get(self.codons[row].tolist())
+        self.fitness[row] = phenotype.fitness
+        self.diversity[row] = diversity_from_signature(phenotype.signature)
+        self._size += 1
+
+    def extend(self, rows):
+        for codons in rows:
+            self.append(codons)
+
+    def replace(self, rows):
+        self._size = 0
+        self.extend(rows)
+
+    def genome(self, row):
+        return self.codons[row].tolist()
+
+    def tolist(self):
+        return self.codons[:self._size].tolist()
+
+    # region Genetic operators
+    def select(self, truncation=TRUNCATION_SIZE):
+        # fittest rows first, ties in pool order like the stable list sort
+        order = np.argsort(-self.fitness[:self._size], kind="stable")
+        return self.codons[order[:truncation]]
+
+    @staticmethod
+    def crossover(parents, rng, crossover_prob=CROSSOVER_PROB):
+        # single point crossover of consecutive parent pairs, both children of a pair kept next to each other
+        pairs = len(parents) // 2
+        first, second = parents[0:2 * pairs:2], parents[1:2 * pairs:2]
+        crossed = rng.random(pairs) <= crossover_prob
+        points = rng.integers(0, parents.shape[1], pairs)
+        head = np.arange(parents.shape[1]) < points[:, None]
+        children = np.stack([np.where(head, first, second), np.where(head, second, first)], axis=1)
+        return children[crossed].reshape(-1, parents.shape[1])
+
+    @staticmethod
+    def mutate(children, rng, mutation_prob=0.01, codon_bits=CODON_BITS):
+        # flips one random bit of each codon with probability mutation_prob, in place
+        flips = rng.random(children.shape) < mutation_prob
+        bits = rng.integers(0, codon_bits, children.shape, dtype=np.uint8)
+        children ^= flips.astype(np.uint8) << bits
+        return children
+
+    def select_children(self, children, size=STORAGE_THRESHOLD):
+        # the most diverse children become the new pool
+        self.replace(children)
+        order = np.argsort(-self.diversity[:self._size], kind="stable")[:size]
+        for values in (self.codons, self.fitness, self.diversity):
+            values[:len(order)] = values[order]
+        self._size = len(order)
+
+    def evolve(self, rng):
+        children = self.mutate(self.crossover(self.select(), rng), rng)
+        self.select_children(children)
+
+    def best(self):
+        # lowest fitness row, what SwarmAgent.update has always compared its own genome against
+        return int(np.argmin(self.fitness[:self._size]))
+    # endregion
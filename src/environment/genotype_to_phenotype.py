@@ -1,5 +1,12 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from behaviour_trees.bytecode import compile_tree
+from behaviour_trees.decisions import DecisionTree
 from behaviour_trees.primitives import *
 from betr_geese.config import *
+from evolution.ponyge_stuff import compile_grammar, map_genome
 
 GRAMMAR = {
     "root": ["sequence", "selector"],
@@ -86,82 +93,181 @@ ACTION_MAPPING = {
 }
 
 
+COMPILED_GRAMMAR = compile_grammar(GRAMMAR, ACTION_MAPPING, start="root", fallback="DummyNode")
+NODE_FACTORIES = [ACTION_MAPPING[name] for name in COMPILED_GRAMMAR.terminals]
+
+
+def _node_names(terminal_id):
+    return {node.name for node in NODE_FACTORIES[terminal_id](None).iterate()}
+
+
+# fitness only looks at which node names a tree contains, so each terminal gets a mask of the names its subtree adds
+NODE_NAME_BITS = {name: 1 << bit for bit, name in
+                  enumerate(sorted(set().union(*map(_node_names, range(COMPILED_GRAMMAR.n_terminals)))))}
+TERMINAL_MASKS = [sum(NODE_NAME_BITS[name] for name in _node_names(terminal_id))
+                  for terminal_id in range(COMPILED_GRAMMAR.n_terminals)]
+EXPLORATION_MASK = NODE_NAME_BITS["MoveTowards_Hub"] | NODE_NAME_BITS["MoveTowards_Site"]
+
+
+def derive(symbol: str, _genome, genome_idx: int, depth=0):
+    # agent independent expansion: preorder terminal ids, child counts, next codon index
+    return map_genome(COMPILED_GRAMMAR, _genome, MAX_TREE_DEPTH, COMPILED_GRAMMAR.symbol_id(symbol), genome_idx, depth)
+
+
+def instantiate(nodes, arity, _agent):
+    # rebuilds py_trees nodes from a preorder derivation, returns the top level nodes
+    roots = []
+    open_parents = []
+    for terminal_id, n_children in zip(nodes, arity):
+        node = NODE_FACTORIES[terminal_id](_agent)
+        if open_parents:
+            parent = open_parents[-1]
+            parent[0].add_child(node)
+            parent[1] -= 1
+            if parent[1] == 0:
+                open_parents.pop()
+        else:
+            roots.append(node)
+        if n_children:
+            open_parents.append([node, n_children])
+    return roots
+
+
 def expand(symbol: str, _genome, genome_idx: int, _agent, depth=0):
-    if symbol not in GRAMMAR:  # terminal
-        assert symbol in ACTION_MAPPING
-        return [ACTION_MAPPING[symbol](_agent)], genome_idx
-    if depth > MAX_TREE_DEPTH:
-        return [ACTION_MAPPING["DummyNode"](_agent)], genome_idx
-
-    productions = GRAMMAR[symbol]
-    choice_idx = _genome[genome_idx % len(_genome)] % len(productions)
-    production = productions[choice_idx]
-    genome_idx += 1
-
-    if isinstance(production, str):
-        # expand further
-        return expand(production, _genome, genome_idx, _agent, depth + 1)
-    elif isinstance(production, list):
-        assert len(production) == 2
-        second_production_options = GRAMMAR[production[1]]
-        choice_idx = _genome[genome_idx % len(_genome)] % len(second_production_options)
-        picked = second_production_options[choice_idx]
-        if picked in GRAMMAR:
-            # this is "objects", gotta expand further
-            genome_idx += 1
-            p_options = GRAMMAR[picked]
-            choice_idx = _genome[genome_idx % len(_genome)] % len(p_options)
-            picked = p_options[choice_idx]
-        genome_idx += 1
-        new_symbol = production[0] + "_" + picked
-        result = expand(new_symbol, _genome, genome_idx, _agent, depth + 1)
-        return result
-    elif isinstance(production, dict):
-        current_parent_symbol = sorted(production.keys())[0]
-        assert current_parent_symbol == "Sequence" or current_parent_symbol == "Selector"
-        current_parent = ACTION_MAPPING[current_parent_symbol](_agent)
-        children = production[current_parent_symbol]
-        assert len(children) > 0
-        for child in children:
-            _children, genome_idx = expand(child, _genome, genome_idx, _agent, depth + 1)
-            assert len(_children) > 0
-            for __child in _children:
-                assert __child is not None
-                current_parent.add_child(__child)
-        assert current_parent is not None
-        return [current_parent], genome_idx
-    elif isinstance(production, tuple):
-        children = []
-        for sym in production:
-            assert isinstance(sym, str)
-            new_children, genome_idx = expand(sym, _genome, genome_idx, _agent, depth + 1)
-            assert len(new_children) > 0
-            for child in new_children:
-                assert child is not None
-            children.extend(new_children)
-        assert len(children) > 0
-        for child in children:
-            assert child is not None
-        return children, genome_idx
-    raise ValueError(f"Invalid production type: {production}")
+    nodes, arity, genome_idx = derive(symbol, _genome, genome_idx, depth)
+    return instantiate(nodes, arity, _agent), genome_idx
+
+
+# flyweight subtrees per terminal id, shared by every tree unless they hold per-agent memory (then None)
+_SHARED_FLYWEIGHTS = {}
+
+
+def _shared_flyweight(terminal_id):
+    if terminal_id not in _SHARED_FLYWEIGHTS:
+        node = NODE_FACTORIES[terminal_id](None)
+        _SHARED_FLYWEIGHTS[terminal_id] = None if has_memory(node) else convert(node)
+    return _SHARED_FLYWEIGHTS[terminal_id]
+
+
+def build_flyweight(nodes, arity):
+    slots = [0]
+    position = 0
+
+    def build():
+        nonlocal position
+        terminal_id, n_children = nodes[position], arity[position]
+        position += 1
+        if n_children == 0:
+            shared = _shared_flyweight(terminal_id)
+            if shared is not None:
+                return shared
+        children = [build() for _ in range(n_children)]
+        return convert(NODE_FACTORIES[terminal_id](None), children, slots)
+
+    root = build()
+    return FlyweightTree(root, slots[0])
+
+
+class Phenotype:
+    def __init__(self, nodes, arity, codons_used):
+        self.nodes = tuple(nodes)
+        self.arity = tuple(arity)
+        self.codons_used = codons_used
+        self.signature = 0
+        for terminal_id in self.nodes:
+            self.signature |= TERMINAL_MASKS[terminal_id]
+        self.fitness = fitness_from_signature(self.signature)
+        self._flyweight = None
+        self._program = None
+        self._decisions = None
+
+    def build(self, _agent):
+        roots = instantiate(self.nodes, self.arity, _agent)
+        assert len(roots) == 1
+        return py_trees.trees.BehaviourTree(roots[0])
+
+    def flyweight(self):
+        # one agent independent tree per phenotype, ticked against per-agent TickContexts
+        if self._flyweight is None:
+            self._flyweight = build_flyweight(self.nodes, self.arity)
+        return self._flyweight
+
+    def program(self):
+        if self._program is None:
+            self._program = compile_tree(self.flyweight())
+        return self._program
+
+    def decision_tree(self):
+        # the table is shared by every agent running this phenotype
+        if self._decisions is None:
+            self._decisions = DecisionTree(self.program(), DECISION_TABLE_SIZE)
+        return self._decisions
+
+    def executable(self, backend):
+        if backend == "flyweight":
+            return self.flyweight()
+        if backend == "decision":
+            return self.decision_tree()
+        return self.program()
+
+
+class PhenotypeCache:
+    # LRU over derivations, keyed on the codons since the expansion depends on nothing else
+    def __init__(self, maxsize=PHENOTYPE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, _genome):
+        key = tuple(_genome)
+        phenotype = self._entries.get(key)
+        if phenotype is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return phenotype
+
+        self.misses += 1
+        phenotype = Phenotype(*derive("root", _genome, 0))
+        self._entries[key] = phenotype
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return phenotype
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "hit_rate": self.hit_rate()}
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+phenotype_cache = PhenotypeCache()
 
 
 def build_bt_from_genome_grammar(_agent, _genome):
-    root, _ = expand("root", _genome, 0, _agent)
-    assert len(root) == 1
-    return py_trees.trees.BehaviourTree(root[0])
+    return phenotype_cache.get(_genome).build(_agent)
 
 
-def compute_diversity(genome):
+# reference implementations over a built tree, the signature based functions below must agree with them
+def tree_diversity(bt):
     unique_nodes = set()
-    for node in genome.bt.root.iterate():
+    for node in bt.root.iterate():
         unique_nodes.add(node.name)
     return (len(unique_nodes) - 2) / (total_unique_nodes - 2)
 
 
-def compute_exploration(genome):
+def tree_exploration(bt):
     visited = set()
-    for node in genome.bt.root.iterate():
+    for node in bt.root.iterate():
         if node.name == "MoveTowards_Hub":
             visited.add("hub")
         elif node.name == "MoveTowards_Site":
@@ -169,8 +275,45 @@ def compute_exploration(genome):
     return len(visited)
 
 
+def diversity_from_signature(signature):
+    return (signature.bit_count() - 2) / (total_unique_nodes - 2)
+
+
+def exploration_from_signature(signature):
+    return (signature & EXPLORATION_MASK).bit_count()
+
+
+def fitness_from_signature(signature):
+    return diversity_from_signature(signature) + exploration_from_signature(signature) / 2
+
+
+def genome_signature(_genome):
+    return phenotype_cache.get(_genome).signature
+
+
+def compute_diversity(genome):
+    return diversity_from_signature(genome_signature(genome.genome))
+
+
+def compute_exploration(genome):
+    return exploration_from_signature(genome_signature(genome.genome))
+
+
 def calculate_fitness(genome):
-    return compute_diversity(genome) + compute_exploration(genome) / 2
+    return fitness_from_signature(genome_signature(genome.genome))
+
+
+def _popcount(values):
+    return np.unpackbits(values.view(np.uint8)).reshape(len(values), -1).sum(axis=1)
+
+
+def calculate_fitness_batch(genomes):
+    # same arithmetic as calculate_fitness, one array op per term for the whole pool
+    signatures = np.fromiter((genome_signature(genome.genome) for genome in genomes), dtype=np.uint64,
+                             count=len(genomes))
+    diversity = (_popcount(signatures) - 2) / (total_unique_nodes - 2)
+    exploration = _popcount(signatures & np.uint64(EXPLORATION_MASK))
+    return diversity + exploration / 2
 
 
 total_unique_nodes = len(ACTION_MAPPING)
@@ -0,0 +1,32 @@
+from environment.utils import *
+
+METRIC_COLUMNS = ("maintenance", "foraging")
+
+
+class ObjectMetrics:
+    # food within the hub radius and debris past the debris boundary, counted as objects move instead of scanned.
+    # Owners must call moved() whenever an object's position is assigned.
+    def __init__(self, hub, objects):
+        self.hub = hub
+        self.food_at_hub = 0
+        self.debris_removed = 0
+        self._counted = {}
+        for obj in objects:
+            self.moved(obj)
+
+    def _counts(self, obj):
+        # the same predicates SwarmModel used to scan with
+        if obj.type == "Food":
+            return dist(obj.pos, self.hub.pos) <= self.hub.radius
+        return dist(obj.pos, self.hub.pos) > self.hub.debris_boundary
+
+    def moved(self, obj):
+        counts = self._counts(obj)
+        if counts == self._counted.get(obj, False):
+            return
+        self._counted[obj] = counts
+        delta = 1 if counts else -1
+        if obj.type == "Food":
+            self.food_at_hub += delta
+        else:
+            self.debris_removed += delta
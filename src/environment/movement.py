@@ -0,0 +1,41 @@
+import numpy as np
+
+from betr_geese.config import *
+
+# Batched movement, shared by SwarmState and replays of an event log
+
+# move kinds, the other two fields of a move are the explore delta or the target position
+EXPLORE = 0
+TOWARDS = 1
+AWAY = 2
+
+
+def distances(points, pos):
+    # utils.dist(points[i], pos) for every row, same operations so comparisons against it agree exactly
+    dx = points[..., 0] - pos[..., 0]
+    dy = points[..., 1] - pos[..., 1]
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def apply_moves(pos, rows, kinds, xs, ys):
+    # one queued move for each of rows (no row twice), the same float operations as SwarmAgent's movement
+    p = pos[rows]
+    explore = kinds == EXPLORE
+    p[explore, 0] += xs[explore]
+    p[explore, 1] += ys[explore]
+
+    steer = ~explore
+    if steer.any():
+        q = p[steer]
+        target = np.stack([xs[steer], ys[steer]], axis=1)
+        away = kinds[steer] == AWAY
+        direction = np.where(away[:, None], q - target, target - q)
+        low = direction.min(axis=1, keepdims=True)
+        high = direction.max(axis=1, keepdims=True)
+        # nan rows (zero spread) come out exactly like the scalar version, no need to warn per batch
+        with np.errstate(invalid="ignore", divide="ignore"):
+            moved = q + (direction - low) / (high - low) * AGENT_SPEED
+        arrived = ~away & ~(distances(q, target) > AGENT_SPEED)
+        moved[arrived] = target[arrived]
+        p[steer] = moved
+    pos[rows] = p
@@ -1,10 +1,16 @@
+import numpy as np
+
+
 class WorldObject:
+    __slots__ = ("pos", "picked_up")
+
     def __init__(self, pos):
         self.pos = pos
         self.picked_up = False
 
 
 class Hub(WorldObject):
+    __slots__ = ("radius", "debris_boundary")
     type = "Hub"
 
     def __init__(self, pos, radius=10, debris_boundary=30):
@@ -14,12 +20,57 @@ class Hub(WorldObject):
 
 
 class Site(WorldObject):
+    __slots__ = ()
     type = "Site"
 
 
-class Food(WorldObject):
+class ObjectStore:
+    # pos and picked_up of every Food and Debris in contiguous arrays, one row per object. The arrays can be passed
+    # in (e.g. views of shared memory), otherwise they are allocated for capacity rows.
+    def __init__(self, capacity=0, pos=None, picked=None):
+        self.pos = np.zeros((capacity, 2)) if pos is None else pos
+        self.picked = np.zeros(capacity, dtype=bool) if picked is None else picked
+
+    def __len__(self):
+        return len(self.picked)
+
+
+class StoredObject:
+    # handle to a row of an ObjectStore, pos reads as a view of the row and assigning it copies into the row
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row, pos=None):
+        self._store = store
+        self._row = row
+        if pos is not None:
+            store.pos[row] = pos
+
+    @property
+    def row(self):
+        return self._row
+
+    @property
+    def pos(self):
+        return self._store.pos[self._row]
+
+    @pos.setter
+    def pos(self, value):
+        self._store.pos[self._row] = value
+
+    @property
+    def picked_up(self):
+        return bool(self._store.picked[self._row])
+
+    @picked_up.setter
+    def picked_up(self, value):
+        self._store.picked[self._row] = value
+
+
+class Food(StoredObject):
+    __slots__ = ()
     type = "Food"
 
 
-class Debris(WorldObject):
+class Debris(StoredObject):
+    __slots__ = ()
     type = "Debris"
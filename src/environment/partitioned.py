@@ -0,0 +1,384 @@
+import os
+import random
+import traceback
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.objects import *
+from environment.swarm_agent import Genome
+from environment.swarm_model import SwarmModel
+from environment.swarm_state import VectorSwarmAgent, distances
+from environment.utils import *
+
+# A swarm split into contiguous blocks of agent rows, each stepped by its own worker process. The world (agent
+# positions, Food/Debris positions and picked_up flags, genome sharing) lives in shared memory and the phases of a
+# step are separated by a barrier. Unlike SwarmModel every agent draws from its own random stream, genomes are
+# exchanged in agent row order and pickup conflicts go to the lowest row, so a run only depends on the seed and not
+# on how many workers step it.
+
+# phases an agent draws random numbers in
+_CREATE = 0
+_SENSE = 1
+_ACT = 2
+_EVOLVE = 3
+
+
+def stream_seed(seed, row, step, phase):
+    return seed << 96 | row << 48 | (step + 1) << 2 | phase
+
+
+def neighbour_pairs(queries, points, radius):
+    # every (query, point) index pair with dist <= radius, sorted by query and then point
+    cell = radius * (1 + 1e-9) + 1e-6
+    q_idx = np.flatnonzero(np.isfinite(queries).all(axis=1))
+    p_idx = np.flatnonzero(np.isfinite(points).all(axis=1))
+    if not len(q_idx) or not len(p_idx):
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    def keys(cx, cy):
+        return (cx << 32) + (cy + (1 << 31))
+
+    p_cells = np.floor(points[p_idx] / cell).astype(np.int64)
+    p_keys = keys(p_cells[:, 0], p_cells[:, 1])
+    order = np.argsort(p_keys, kind="stable")
+    sorted_keys = p_keys[order]
+    q_cells = np.floor(queries[q_idx] / cell).astype(np.int64)
+
+    found_q, found_p = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = keys(q_cells[:, 0] + dx, q_cells[:, 1] + dy)
+            lo = np.searchsorted(sorted_keys, target, side="left")
+            counts = np.searchsorted(sorted_keys, target, side="right") - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+            starts = np.repeat(lo, counts)
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            found_q.append(np.repeat(q_idx, counts))
+            found_p.append(p_idx[order[starts + within]])
+    if not found_q:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    q = np.concatenate(found_q)
+    p = np.concatenate(found_p)
+    close = distances(points[p], queries[q]) <= radius
+    q, p = q[close], p[close]
+    order = np.lexsort((p, q))
+    return q[order], p[order]
+
+
+class SharedArrays:
+    # named numpy arrays in shared memory, create() them in the parent and attach() to its layout in the workers
+    def __init__(self, blocks, layout):
+        self._blocks = blocks
+        self.layout = layout
+        for name, (_, shape, dtype) in layout.items():
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf))
+
+    @classmethod
+    def create(cls, fields):
+        # fields: name -> (shape, dtype, initial value)
+        blocks, layout = {}, {}
+        for name, (shape, dtype, _) in fields.items():
+            dtype = np.dtype(dtype)
+            block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+            blocks[name] = block
+            layout[name] = (block.name, shape, dtype.str)
+        arrays = cls(blocks, layout)
+        for name, (_, _, value) in fields.items():
+            getattr(arrays, name)[...] = value
+        return arrays
+
+    @classmethod
+    def attach(cls, layout):
+        return cls({name: shared_memory.SharedMemory(name=block) for name, (block, _, _) in layout.items()}, layout)
+
+    def close(self, unlink=False):
+        for name in self.layout:
+            setattr(self, name, None)
+        for block in self._blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+
+
+class PartitionAgent(VectorSwarmAgent):
+    def __init__(self, model, genome=None):
+        self.global_row = model.lo + len(model.state)
+        super().__init__(model, genome)
+
+    def _reseed(self, phase):
+        random.seed(stream_seed(self.model.run_seed, self.global_row, self.model.time, phase))
+
+    def _evolution_rng(self):
+        return np.random.default_rng(stream_seed(self.model.run_seed, self.global_row, self.model.time, _EVOLVE))
+
+    def sense(self):
+        # only decides whether to share, PartitionModel.exchange() hands the genome to the neighbours
+        if self._should_evolve:
+            self._reseed(_SENSE)
+            self.model.world.sharing[self.global_row] = random.random() <= INTERACTION_PROB
+
+    def act(self):
+        self._reseed(_ACT)
+        super().act()
+
+    def pickup(self, obj):
+        # only a claim, PartitionModel.resolve_claims() hands the object to the lowest claiming row
+        if not (isinstance(obj, Food) or isinstance(obj, Debris)):
+            return False
+        # available when the step started, flags of objects dropped meanwhile may be changing in other workers
+        if obj not in self.model.object_index[obj.type]:
+            return False
+        if dist(self.pos, obj.pos) > AGENT_SPEED:
+            return False
+        self.model.claim(self, obj)
+        return True
+
+    def drop(self, obj_type):
+        # not put back into the worker's object_index, or only this worker's agents could claim it this step. Every
+        # worker sees it again when step() rebuilds the index.
+        if self.carrying and self.carrying.type == obj_type:
+            if self.model.event_log is not None:
+                self.model.event_log.drop(self, self.carrying)
+            self.carrying.pos = self.pos.copy()
+            self.model.object_moved(self.carrying)
+            self.carrying.picked_up = False
+            self.carrying = None
+            self.blackboard.is_carrying = False
+            return True
+        return False
+
+
+class PartitionModel(SwarmModel):
+    # rows [lo, hi) of a PartitionedSwarm, built and stepped inside one worker
+    def __init__(self, world, config, partition, lo, hi, barrier):
+        self.world = world
+        self.config = config
+        self.partition = partition
+        self.lo = lo
+        self.hi = hi
+        self.barrier = barrier
+        self._claims = []
+        template = config["template"]
+        super().__init__(n_agents=hi - lo, n_sites=len(config["sites"]), n_food=config["n_food"],
+                         n_debris=len(world.object_picked) - config["n_food"],
+                         template_genome=None if template is None else Genome(template, None),
+                         seed=config["seed"] + partition, spatial_index=False, bt_backend=config["bt_backend"],
+                         engine="vectorized")
+        self.run_seed = config["seed"]
+        # the agents were placed in the private arrays while being created, from now on they move in the shared ones
+        world.agent_pos[lo:hi] = self.state.pos[:hi - lo]
+        self.state.pos = world.agent_pos[lo:hi]
+        self._write_codons()
+
+    def _init_sites(self, n):
+        self.sites = [Site(np.array(pos, dtype='float64')) for pos in self.config["sites"]]
+        return self.sites
+
+    def _init_object_store(self, n):
+        # placed by PartitionedSwarm, objects other partitions pick up or drop change here too
+        return ObjectStore(pos=self.world.object_pos, picked=self.world.object_picked)
+
+    def _init_food(self, n):
+        self.food = [Food(self.object_store, i) for i in range(n)]
+        return self.food
+
+    def _init_debris(self, n):
+        self.debris = [Debris(self.object_store, len(self.food) + i) for i in range(n)]
+        return self.debris
+
+    def _init_agents(self, agent_class, n, template_genome):
+        agents = []
+        for row in range(self.lo, self.lo + n):
+            random.seed(stream_seed(self.config["seed"], row, -1, _CREATE))
+            agents.append(self.config["agent_class"](self, template_genome))
+        return agents
+
+    def _write_codons(self):
+        for agent in self.state.agents:
+            self.world.codons[agent.global_row] = agent.genome.genome
+
+    def step(self):
+        agents = self.state.agents
+        # objects other partitions picked up or dropped last step
+        self.world.claims[self.partition] = self.config["n_agents"]
+        self.object_index = {"Food": self._index_objects(self.food, self.object_store),
+                             "Debris": self._index_objects(self.debris, self.object_store)}
+        self.state.sense()
+        for agent in agents:
+            agent.sense()
+        self.barrier.wait()
+
+        self.exchange()
+        self.barrier.wait()
+
+        self.state.begin_act()
+        for agent in agents:
+            agent.act()
+        self.state.end_act()
+        self.barrier.wait()
+
+        self.resolve_claims()
+        for agent in agents:
+            agent.update()
+        self._write_codons()
+        self.world.sharing[self.lo:self.hi] = False
+        self.time += 1
+        self.barrier.wait()
+
+    def exchange(self):
+        world = self.world
+        sharers = np.flatnonzero(world.sharing)
+        if not len(sharers):
+            return
+        own, sharer = neighbour_pairs(world.agent_pos[self.lo:self.hi], world.agent_pos[sharers],
+                                      GENOME_EXCHANGE_RADIUS)
+        agents = self.state.agents
+        for row, other in zip(own.tolist(), sharers[sharer].tolist()):
+            agent = agents[row]
+            if other != agent.global_row and agent._should_evolve:
+                agent.genome_storage_pool.append(world.codons[other])
+
+    def claim(self, agent, obj):
+        claims = self.world.claims[self.partition]
+        row = self.state.object_row(obj)
+        claims[row] = min(claims[row], agent.global_row)
+        self._claims.append((agent, obj))
+
+    def resolve_claims(self):
+        if not self.world.claims.size:
+            return
+        winners = self.world.claims.min(axis=0)
+        for agent, obj in self._claims:
+            if winners[self.state.object_row(obj)] == agent.global_row and not obj.picked_up:
+                agent.pos = obj.pos
+                agent.blackboard.is_carrying = True
+                agent.carrying = obj
+                obj.picked_up = True
+                self.object_index[obj.type].remove(obj)
+        self._claims = []
+
+
+def _worker(partition, lo, hi, layout, config, barrier, conn):
+    world = SharedArrays.attach(layout)
+    try:
+        model = PartitionModel(world, config, partition, lo, hi, barrier)
+        conn.send(("ready", None))
+        while True:
+            command, steps = conn.recv()
+            if command == "stop":
+                break
+            for _ in range(steps):
+                model.step()
+            conn.send(("done", None))
+    except Exception:
+        # wake the others up instead of leaving them at the barrier
+        barrier.abort()
+        conn.send(("error", traceback.format_exc()))
+
+
+class PartitionedSwarm:
+    def __init__(self, n_agents=100, n_workers=None, n_sites=1, n_food=100, n_debris=100, template_genome=None,
+                 seed=None, bt_backend="decision", agent_class=PartitionAgent):
+        # agent_class: PartitionAgent or a subclass of it, importable by the workers
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.time = 0
+        n_workers = max(1, min(n_workers or os.cpu_count(), n_agents))
+
+        # sites and objects placed exactly like SwarmModel does, without touching the caller's random state
+        state = random.getstate()
+        random.seed(seed)
+        placed = SwarmModel(n_agents=0, n_sites=n_sites, n_food=n_food, n_debris=n_debris, seed=seed)
+        random.setstate(state)
+        self.hub = placed.hub
+        self.sites = placed.sites
+
+        template = None if template_genome is None else list(template_genome.genome)
+        genome_length = GENOME_SIZE if template is None else len(template)
+        self.world = SharedArrays.create({
+            "agent_pos": ((n_agents, 2), 'float64', 0),
+            # Food rows and then Debris rows, like a SwarmModel's object store
+            "object_pos": ((n_food + n_debris, 2), 'float64', placed.object_store.pos),
+            "object_picked": ((n_food + n_debris,), bool, False),
+            "sharing": ((n_agents,), bool, False),
+            "codons": ((n_agents, genome_length), np.uint8, 0),
+            # per worker, the lowest agent row claiming each object (n_agents for none)
+            "claims": ((n_workers, n_food + n_debris), np.int64, n_agents),
+        })
+
+        self.n_food = n_food
+        config = {"seed": seed, "n_agents": n_agents, "n_food": n_food,
+                  "sites": [site.pos.tolist() for site in self.sites], "template": template, "bt_backend": bt_backend,
+                  "agent_class": agent_class}
+        context = get_context()
+        barrier = context.Barrier(n_workers)
+        self._workers = []
+        bounds = np.linspace(0, n_agents, n_workers + 1).astype(int)
+        for partition in range(n_workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=_worker, daemon=True,
+                                      args=(partition, int(bounds[partition]), int(bounds[partition + 1]),
+                                            self.world.layout, config, barrier, child))
+            process.start()
+            self._workers.append((process, parent))
+        self._collect("ready")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _collect(self, expected):
+        errors = []
+        for process, conn in self._workers:
+            while not conn.poll(0.1):
+                if not process.is_alive():
+                    self.close()
+                    raise RuntimeError(f"partition worker exited with code {process.exitcode}")
+            status, message = conn.recv()
+            if status != expected:
+                errors.append(message)
+        if errors:
+            self.close()
+            raise RuntimeError("partition worker failed:\n" + "\n".join(errors))
+
+    def step(self, steps=1):
+        for _, conn in self._workers:
+            conn.send(("step", steps))
+        self._collect("done")
+        self.time += steps
+
+    def close(self):
+        if self.world is None:
+            return
+        for process, conn in self._workers:
+            if process.is_alive():
+                conn.send(("stop", None))
+        for process, _ in self._workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.world.close(unlink=True)
+        self.world = None
+
+    # region Evaluation
+    def positions(self):
+        return self.world.agent_pos.copy()
+
+    def genomes(self):
+        return self.world.codons.tolist()
+
+    def food_at_hub_fraction(self):
+        food = self.world.object_pos[:self.n_food]
+        return np.count_nonzero(distances(food, self.hub.pos) <= self.hub.radius) / len(food)
+
+    def debris_removed_fraction(self):
+        debris = self.world.object_pos[self.n_food:]
+        return np.count_nonzero(distances(debris, self.hub.pos) > self.hub.debris_boundary) / len(debris)
+    # endregion
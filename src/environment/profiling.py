@@ -0,0 +1,244 @@
+import functools
+import json
+import sys
+import time
+
+import mesa
+import numpy as np
+
+from behaviour_trees.base import AgentBehaviour
+from betr_geese.config import *
+from environment import genotype_to_phenotype
+from environment.genome_pool import GenomePool
+from environment.genotype_to_phenotype import Phenotype, PhenotypeCache, phenotype_cache
+from environment.scheduler import ArrayScheduler
+from environment.swarm_agent import Genome, SwarmAgent
+from environment.swarm_state import SwarmState
+
+# Wall time and call counts inside SwarmModel.step, per phase, per BT leaf (by node name), for tree builds, fitness
+# and the genetic operators. Nothing is instrumented until a profiler is attached: attach() swaps timing wrappers
+# into the classes and modules and detach() puts the originals back, so a model that is not profiled runs the
+# plain code. The patches are process wide, so the wrappers only record between begin_step() and end_step() of the
+# attached model, calls made by other models in the process are not counted. Times are inclusive, e.g. a phase
+# includes the ticks run in it and a tick the leaves it evaluated.
+
+_METHODS = [
+    (mesa.agent.AgentSet, "shuffle_do"),
+    (ArrayScheduler, "shuffle_do"),
+    (SwarmState, "sense"),
+    (SwarmState, "begin_act"),
+    (SwarmState, "end_act"),
+    (Genome, "tick"),
+    (Phenotype, "build"),
+    (PhenotypeCache, "get"),
+    (SwarmAgent, "share_genome"),
+    (GenomePool, "select"),
+    (GenomePool, "crossover"),
+    (GenomePool, "mutate"),
+    (GenomePool, "select_children"),
+    (GenomePool, "evolve"),
+]
+_FUNCTIONS = ["build_bt_from_genome_grammar", "calculate_fitness", "calculate_fitness_batch"]
+
+_active = None
+
+
+def _leaf_classes(cls=AgentBehaviour):
+    for sub in cls.__subclasses__():
+        if "evaluate" in sub.__dict__:
+            yield sub
+        yield from _leaf_classes(sub)
+
+
+class StepProfiler:
+    def __init__(self):
+        self.series = []
+        self._current = {}
+        self._patched = []
+        self._model = None
+        self._last = None
+        self._recording = False
+
+    # region Patching
+    def _record(self, key, seconds):
+        entry = self._current.get(key)
+        if entry is None:
+            self._current[key] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def _timed(self, key, func):
+        profiler = self
+        record = self._record
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if not profiler._recording:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(key, perf_counter() - start)
+
+        return timed
+
+    def _timed_phase(self, func):
+        profiler = self
+        record = self._record
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def timed(agent_set, method, *args, **kwargs):
+            if not profiler._recording:
+                return func(agent_set, method, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(agent_set, method, *args, **kwargs)
+            finally:
+                record(f"phase:{method if isinstance(method, str) else method.__name__}", perf_counter() - start)
+
+        return timed
+
+    def _timed_leaf(self, func):
+        profiler = self
+        record = self._record
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def timed(behaviour, agent):
+            if not profiler._recording:
+                return func(behaviour, agent)
+            start = perf_counter()
+            try:
+                return func(behaviour, agent)
+            finally:
+                record("node:" + behaviour.name, perf_counter() - start)
+
+        return timed
+
+    def _patch(self, owner, name, wrapper):
+        original = owner.__dict__[name]
+        self._patched.append((owner, name, original))
+        if isinstance(original, staticmethod):
+            setattr(owner, name, staticmethod(wrapper(original.__func__)))
+        else:
+            setattr(owner, name, wrapper(original))
+
+    def _patch_all(self):
+        for cls, name in _METHODS:
+            if name == "shuffle_do":
+                self._patch(cls, name, self._timed_phase)
+            else:
+                self._patch(cls, name, functools.partial(self._timed, f"{cls.__name__}.{name}"))
+        for cls in list(_leaf_classes()):
+            self._patch(cls, "evaluate", self._timed_leaf)
+        # star imports copied the functions into other modules, patch every module holding the original
+        for name in _FUNCTIONS:
+            original = getattr(genotype_to_phenotype, name)
+            wrapper = self._timed(name, original)
+            for module in list(sys.modules.values()):
+                if getattr(module, name, None) is original:
+                    self._patched.append((module, name, original))
+                    setattr(module, name, wrapper)
+
+    def _unpatch_all(self):
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched = []
+
+    def _rebind_leaves(self):
+        # bytecode programs hold bound evaluate()s, bind them to the current ones. Decision tables replay ticks
+        # without evaluating the leaves, only the attached model's are cleared so its leaves get timed.
+        model_phenotypes = [] if self._model is None else [a.genome._phenotype for a in self._model.agents]
+        for phenotype in list(phenotype_cache._entries.values()) + model_phenotypes:
+            program = phenotype._program
+            if program is not None:
+                program.leaves[:] = [behaviour.evaluate for behaviour in program.behaviours]
+        for phenotype in model_phenotypes:
+            if phenotype._decisions is not None:
+                phenotype._decisions.table.clear()
+    # endregion
+
+    def attach(self, model):
+        global _active
+        if _active is not None:
+            raise RuntimeError("another StepProfiler is attached")
+        _active = self
+        self._model = model
+        self._patch_all()
+        self._rebind_leaves()
+        model.profiler = self
+        return self
+
+    def detach(self):
+        global _active
+        if _active is not self:
+            return
+        self._recording = False
+        self._unpatch_all()
+        self._rebind_leaves()
+        self._model.profiler = None
+        self._model = None
+        _active = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.detach()
+
+    def begin_step(self, model):
+        # called by SwarmModel.step() before anything else
+        self._current = {}
+        self._recording = True
+        self._last = time.perf_counter()
+
+    def end_step(self, model):
+        # called by SwarmModel.step() once the step is done
+        now = time.perf_counter()
+        self._recording = False
+        self.series.append({"time": model.time, "step": now - self._last, "entries": self._current})
+        self._current = {}
+
+    # region Results
+    def keys(self):
+        keys = set()
+        for row in self.series:
+            keys.update(row["entries"])
+        return sorted(keys)
+
+    def per_step(self, key):
+        # seconds and calls of key in every recorded step
+        seconds = np.array([row["entries"].get(key, (0.0, 0))[0] for row in self.series])
+        calls = np.array([row["entries"].get(key, (0.0, 0))[1] for row in self.series])
+        return seconds, calls
+
+    def summary(self, bins=PROFILE_HISTOGRAM_BINS):
+        def describe(seconds, calls=None):
+            counts, edges = np.histogram(seconds, bins=bins)
+            result = {"total": float(seconds.sum()), "mean": float(seconds.mean()),
+                      "p50": float(np.percentile(seconds, 50)), "p95": float(np.percentile(seconds, 95)),
+                      "max": float(seconds.max()), "histogram": {"edges": edges.tolist(), "counts": counts.tolist()}}
+            if calls is not None:
+                result["calls"] = int(calls.sum())
+            return result
+
+        if not self.series:
+            return {}
+        summary = {"step": describe(np.array([row["step"] for row in self.series]))}
+        for key in self.keys():
+            summary[key] = describe(*self.per_step(key))
+        return summary
+
+    def save(self, path, bins=PROFILE_HISTOGRAM_BINS):
+        keys = self.keys()
+        series = {"time": [row["time"] for row in self.series], "step": [row["step"] for row in self.series]}
+        for key in keys:
+            seconds, calls = self.per_step(key)
+            series[key] = {"seconds": seconds.tolist(), "calls": calls.tolist()}
+        with open(path, "w") as f:
+            json.dump({"series": series, "summary": self.summary(bins)}, f)
+    # endregion
@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+
+# Random numbers for SwarmModel(rng_mode="streams"): the model and every agent draw from streams of their own,
+# spawned from the model's seed in creation order, so what an agent draws only depends on the seed and on how many
+# were created before it, not on the other agents' draws or on which process runs it. A stream offers the calls
+# the agents make on the random module, which stands in for the streams in "global" mode.
+
+RNG_MODES = ("global", "streams")
+
+
+class RandomStream(random.Random):
+    # a random.Random seeded from its own SeedSequence, so the calls the agents make draw at the random module's
+    # (C) speed
+    def __init__(self, seed_sequence):
+        draws, evolution = seed_sequence.spawn(2)
+        super().__init__(int.from_bytes(draws.generate_state(4, np.uint64).tobytes(), "little"))
+        # GenomePool.evolve() draws arrays, from a numpy generator of its own
+        self.evolution = np.random.default_rng(evolution)
+
+    # region State
+    def get_state(self):
+        # JSON-able
+        version, internal, gauss_next = self.getstate()
+        return {"random": [version, list(internal), gauss_next], "evolution": self.evolution.bit_generator.state}
+
+    def set_state(self, state):
+        version, internal, gauss_next = state["random"]
+        self.setstate((version, tuple(internal), gauss_next))
+        self.evolution.bit_generator.state = state["evolution"]
+    # endregion
+
+
+class StreamSource:
+    # the model's stream first, then one per agent in creation order
+    def __init__(self, seed):
+        self._root = np.random.SeedSequence(seed)
+
+    def spawn(self):
+        return RandomStream(self._root.spawn(1)[0])
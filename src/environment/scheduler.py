@@ -0,0 +1,25 @@
+SCHEDULERS = ("mesa", "array")
+
+
+class ArrayScheduler:
+    # random activation without mesa's AgentSet: the agents are kept in a list in the order they were added, each
+    # phase shuffles a copy of it with the model's random like AgentSet.shuffle_do() shuffles its keyrefs (a shuffle
+    # only depends on the length), so the agents run in the same order, and calls their bound methods directly
+    # instead of dispatching by name. Agents added to the model afterwards are not scheduled.
+    def __init__(self, model):
+        self.random = model.random
+        self.agents = list(model.agents)
+        self._bound = {}
+
+    def __len__(self):
+        return len(self.agents)
+
+    def shuffle_do(self, method):
+        bound = self._bound.get(method)
+        if bound is None:
+            bound = self._bound[method] = [getattr(agent, method) for agent in self.agents]
+        order = bound.copy()
+        self.random.shuffle(order)
+        for call in order:
+            call()
+        return self
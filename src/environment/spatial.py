@@ -0,0 +1,193 @@
+import math
+
+import numpy as np
+
+from environment.movement import distances
+from environment.utils import *
+
+# slack added to query ranges so float rounding at cell borders never drops a true neighbour
+_CELL_SLACK = 1e-6
+# rings with fewer items than this are cheaper to walk item by item than to hand to numpy
+_BULK_ITEMS = 32
+
+
+# uniform grid over anything with a `pos`, owners must call move() whenever an item's position changes
+class SpatialGrid:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._items = {}
+        # rank is the first insertion order and survives remove/insert, it breaks ties like a list scan would
+        self._ranks = {}
+        self._unplaced = 0
+        self._bounds = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def _key(self, pos):
+        x, y = pos[0], pos[1]
+        if not (math.isfinite(x) and math.isfinite(y)):
+            # nan/inf positions never satisfy a distance check, keep them out of the cells
+            return None
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, item):
+        if item not in self._ranks:
+            self._ranks[item] = len(self._ranks)
+        key = self._key(item.pos)
+        self._items[item] = key
+        self._place(key, item)
+
+    def remove(self, item):
+        self._discard(self._items.pop(item), item)
+
+    def move(self, item):
+        old_key = self._items[item]
+        key = self._key(item.pos)
+        if key == old_key:
+            return
+        self._discard(old_key, item)
+        self._place(key, item)
+        self._items[item] = key
+
+    def _place(self, key, item):
+        if key is None:
+            self._unplaced += 1
+            return
+        self._cells.setdefault(key, {})[item] = None
+        # bounds only ever grow, they just cap how far a nearest() search walks
+        if self._bounds is None:
+            self._bounds = [key[0], key[1], key[0], key[1]]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], key[0])
+            bounds[1] = min(bounds[1], key[1])
+            bounds[2] = max(bounds[2], key[0])
+            bounds[3] = max(bounds[3], key[1])
+
+    def _discard(self, key, item):
+        if key is None:
+            self._unplaced -= 1
+            return
+        cell = self._cells[key]
+        del cell[item]
+        if not cell:
+            del self._cells[key]
+
+    def ranked(self):
+        # every item in rank order, the order a linear scan would see them in
+        return sorted(self._items, key=self._ranks.__getitem__)
+
+    def within(self, pos, radius):
+        # same predicate and insertion order as a linear scan over every item
+        if self._key(pos) is None:
+            return []
+        reach = radius + _CELL_SLACK
+        x0 = math.floor((pos[0] - reach) / self.cell_size)
+        x1 = math.floor((pos[0] + reach) / self.cell_size)
+        y0 = math.floor((pos[1] - reach) / self.cell_size)
+        y1 = math.floor((pos[1] + reach) / self.cell_size)
+        found = []
+        cells = self._cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    continue
+                for item in cell:
+                    if dist(pos, item.pos) <= radius:
+                        found.append(item)
+        if len(found) > 1:
+            found.sort(key=self._ranks.__getitem__)
+        return found
+
+    def nearest(self, pos):
+        # same answer as min() over the items in rank order, searched ring by ring outwards from pos
+        if not self._items:
+            return None
+        origin = self._key(pos)
+        if origin is None or self._unplaced:
+            # nan/inf distances make min() order dependent, so fall back to the plain scan
+            return min(self.ranked(), key=lambda i: dist(pos, i.pos))
+
+        cx, cy = origin
+        bx0, by0, bx1, by1 = self._bounds
+        first_ring = max(0, bx0 - cx, cx - bx1, by0 - cy, cy - by1)
+        last_ring = max(cx - bx0, bx1 - cx, cy - by0, by1 - cy)
+        best, best_dist, best_rank = None, None, None
+        for ring in range(first_ring, last_ring + 1):
+            # anything in this ring or further out is at least (ring - 1) cells away
+            if best is not None and best_dist < (ring - 1) * self.cell_size - _CELL_SLACK:
+                break
+            closest = self._closest(pos, [item for cell in self._ring(cx, cy, ring) for item in cell])
+            if closest is None:
+                continue
+            item, d, rank = closest
+            if best is None or d < best_dist or (d == best_dist and rank < best_rank):
+                best, best_dist, best_rank = item, d, rank
+        return best
+
+    def _closest(self, pos, items):
+        # (item, distance, rank) of the closest of items, the lowest rank among equally close ones
+        ranks = self._ranks
+        best, best_dist, best_rank = None, None, None
+        for item in items:
+            d = dist(pos, item.pos)
+            if best is None or d < best_dist or (d == best_dist and ranks[item] < best_rank):
+                best, best_dist, best_rank = item, d, ranks[item]
+        return None if best is None else (best, best_dist, best_rank)
+
+    def _ring(self, cx, cy, ring):
+        # the occupied cells `ring` cells away from (cx, cy), within the bounds
+        cells = self._cells
+        bx0, by0, bx1, by1 = self._bounds
+        for y in range(max(cy - ring, by0), min(cy + ring, by1) + 1):
+            if y == cy - ring or y == cy + ring:
+                xs = range(max(cx - ring, bx0), min(cx + ring, bx1) + 1)
+            else:
+                xs = [x for x in (cx - ring, cx + ring) if bx0 <= x <= bx1]
+            for x in xs:
+                cell = cells.get((x, y))
+                if cell is not None:
+                    yield cell
+
+
+class ObjectGrid(SpatialGrid):
+    # SpatialGrid over handles to the rows of an ObjectStore. nearest() takes the distances of a crowded ring from
+    # the store in one go and those of the others from positions kept as floats when items are placed.
+    def __init__(self, cell_size, store):
+        super().__init__(cell_size)
+        self.store = store
+        self._points = {}
+
+    def insert(self, item):
+        super().insert(item)
+        self._points[item] = tuple(self.store.pos[item.row].tolist())
+
+    def remove(self, item):
+        super().remove(item)
+        del self._points[item]
+
+    def move(self, item):
+        super().move(item)
+        self._points[item] = tuple(self.store.pos[item.row].tolist())
+
+    def _closest(self, pos, items):
+        if len(items) < _BULK_ITEMS:
+            points = self._points
+            ranks = self._ranks
+            best, best_dist, best_rank = None, None, None
+            for item in items:
+                d = dist(pos, points[item])
+                if best is None or d < best_dist or (d == best_dist and ranks[item] < best_rank):
+                    best, best_dist, best_rank = item, d, ranks[item]
+            return None if best is None else (best, best_dist, best_rank)
+        rows = np.fromiter((item.row for item in items), dtype=np.intp, count=len(items))
+        d = distances(self.store.pos[rows], np.asarray(pos, dtype='float64'))
+        ranks = self._ranks
+        closest = min(np.flatnonzero(d == d.min()), key=lambda i: ranks[items[i]])
+        return items[closest], d[closest], ranks[items[closest]]
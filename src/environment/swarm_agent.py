@@ -4,79 +4,122 @@ import random
 import numpy as np
 from mesa import Agent
 
+from environment.genome_pool import GenomePool
+from environment.movement import AWAY, EXPLORE, TOWARDS
 from environment.genotype_to_phenotype import *
 
 
+BT_BACKENDS = ("py_trees", "flyweight", "bytecode", "decision")
+
+
 class Genome:
-    def __init__(self, genome, agent, bt):
+    def __init__(self, genome, agent, bt=None):
         self.genome = genome
         self._agent = agent
-        self.bt = build_bt_from_genome_grammar(agent, genome)
-        self.fitness = calculate_fitness(self)
+        # a passed in bt must already be bound to agent, otherwise the tree is built on first use
+        self._bt = bt
+        self._context = None
+        self._phenotype = phenotype_cache.get(genome)
+        self.fitness = self._phenotype.fitness
+
+    @property
+    def bt(self):
+        if self._bt is None:
+            self._bt = self._phenotype.build(self._agent)
+        return self._bt
+
+    def tick(self):
+        backend = self._agent.model.bt_backend
+        if backend == "py_trees":
+            self.bt.tick()
+            return
+        if self._context is None:
+            self._context = self._phenotype.executable(backend).new_context(self._agent)
+        self._context.tick()
 
     def rebuild_bt(self):
-        self.bt = build_bt_from_genome_grammar(self._agent, self.genome)
-        self.fitness = calculate_fitness(self)
+        # the codons changed, drop the stale tree and let the next tick build the new one
+        self._bt = None
+        self._context = None
+        self._phenotype = phenotype_cache.get(self.genome)
+        self.fitness = self._phenotype.fitness
 
     def get_fitness(self):
         return self.fitness
 
 
+class AgentState:
+    # what the BT leaves read and act() writes, one record per agent
+    __slots__ = ("is_carrying", "nearest_food", "nearest_debris", "nearest_hub", "nearest_site", "hub", "site",
+                 "target_object", "visited_hub", "visited_site", "avoided_last_step_hub", "avoided_last_step_site")
+
+    def __init__(self):
+        self.is_carrying = False
+        self.nearest_food = None
+        self.nearest_debris = None
+        self.nearest_hub = None
+        self.nearest_site = None
+        self.hub = None
+        self.site = None
+        self.target_object = None
+        self.visited_hub = False
+        self.visited_site = False
+        self.avoided_last_step_hub = False
+        self.avoided_last_step_site = False
+
+
+class BlackboardState:
+    # debugging stand-in for AgentState: the same keys on a py_trees blackboard client, under /agent_<unique_id>
+    # so agents keep their own values, and shown by py_trees.display.unicode_blackboard()
+    def __init__(self, agent):
+        client = py_trees.blackboard.Client(name=f"Agent_{agent.unique_id}", namespace=f"agent_{agent.unique_id}")
+        defaults = AgentState()
+        for key in AgentState.__slots__:
+            client.register_key(key, access=py_trees.common.Access.WRITE)
+            setattr(client, key, getattr(defaults, key))
+        object.__setattr__(self, "client", client)
+
+    def __getattr__(self, key):
+        return getattr(self.client, key)
+
+    def __setattr__(self, key, value):
+        setattr(self.client, key, value)
+
+
 class SwarmAgent(Agent):
 
     def __init__(self, model, genome=None):
         super().__init__(model)
         self._should_evolve = genome is None
+        # the random module, or this agent's RandomStream when the model has streams
+        self.stream = random if model.streams is None else model.streams.spawn()
         self._init_blackboard()
 
         self.carrying = None
         self.pos = model.hub.pos.copy()
+        if model.agent_grid is not None:
+            model.agent_grid.insert(self)
         self.blackboard.hub = model.hub
         self.blackboard.site = model.sites[0]
 
         if self._should_evolve:
-            bla = [random.randint(0, 50) for _ in range(GENOME_SIZE)]
-            bt = build_bt_from_genome_grammar(self, bla)
-            self.genome = Genome(bla, self, bt)
-            self.genome.fitness = calculate_fitness(self.genome)
-            self.genome_storage_pool = [self.genome]
+            bla = [self.stream.randint(0, 50) for _ in range(GENOME_SIZE)]
+            self.genome = Genome(bla, self)
+            self.genome_storage_pool = GenomePool(len(bla))
+            self.genome_storage_pool.append(bla)
         else:
-            self.genome = Genome(genome.genome[:], self, build_bt_from_genome_grammar(self, genome.genome))
+            self.genome = Genome(genome.genome[:], self)
 
-    @staticmethod
-    def create_agents(model, n):
-        return [SwarmAgent(model) for _ in range(n)]
+    @classmethod
+    def create_agents(cls, model, n):
+        return [cls(model) for _ in range(n)]
 
     @classmethod
     def from_genome(cls, model, genome, n):
         return [cls(model, genome) for _ in range(n)]
 
     def _init_blackboard(self):
-        self.blackboard = py_trees.blackboard.Client(name="Agent")
-        self.blackboard.register_key("is_carrying", access=py_trees.common.Access.WRITE)
-        self.blackboard.is_carrying = False
-        self.blackboard.register_key("nearest_food", access=py_trees.common.Access.WRITE)
-        self.blackboard.nearest_food = None
-        self.blackboard.register_key("nearest_debris", access=py_trees.common.Access.WRITE)
-        self.blackboard.nearest_debris = None
-        self.blackboard.register_key("nearest_hub", access=py_trees.common.Access.WRITE)
-        self.blackboard.nearest_hub = None
-        self.blackboard.register_key("nearest_site", access=py_trees.common.Access.WRITE)
-        self.blackboard.nearest_site = None
-        self.blackboard.register_key("hub", access=py_trees.common.Access.WRITE)
-        self.blackboard.hub = None
-        self.blackboard.register_key("site", access=py_trees.common.Access.WRITE)
-        self.blackboard.site = None
-        self.blackboard.register_key("target_object", access=py_trees.common.Access.WRITE)
-        self.blackboard.target_object = None
-        self.blackboard.register_key("visited_hub", access=py_trees.common.Access.WRITE)
-        self.blackboard.visited_hub = False
-        self.blackboard.register_key("visited_site", access=py_trees.common.Access.WRITE)
-        self.blackboard.visited_site = False
-        self.blackboard.register_key("avoided_last_step_hub", access=py_trees.common.Access.WRITE)
-        self.blackboard.avoided_last_step_hub = False
-        self.blackboard.register_key("avoided_last_step_site", access=py_trees.common.Access.WRITE)
-        self.blackboard.avoided_last_step_site = False
+        self.blackboard = BlackboardState(self) if self.model.debug_blackboard else AgentState()
 
     @staticmethod
     def nearest(agent, objects):
@@ -89,23 +132,21 @@ class SwarmAgent(Agent):
             self.share_genome()
 
     def share_genome(self):
-        if random.random() > INTERACTION_PROB:
+        if self.stream.random() > INTERACTION_PROB:
             return
 
-        neighbors = [
-            a for a in self.model.agents
-            if a is not self and dist(self.pos, a.pos) <= GENOME_EXCHANGE_RADIUS
-        ]
+        neighbors = self.model.agents_near(self, GENOME_EXCHANGE_RADIUS)
 
         if not neighbors:
             return
 
         for neighbor in neighbors:
             if isinstance(neighbor, SwarmAgent):
-                neighbor.exchange_genome(Genome(self.genome.genome[:], neighbor, self.genome.bt))
+                neighbor.exchange_genome(self.genome)
 
     def exchange_genome(self, new_genome):
-        self.genome_storage_pool.append(new_genome)
+        # only the codons are stored, the pool copies them
+        self.genome_storage_pool.append(new_genome.genome)
 
     def act(self):
         self.blackboard.visited_hub = False
@@ -114,68 +155,29 @@ class SwarmAgent(Agent):
         self.blackboard.avoided_last_step_site = False
         if self.carrying:
             self.carrying.pos = self.pos.copy()
+            self.model.object_moved(self.carrying)
 
         # tick the BT
         self._update_visited()
-        self.genome.bt.tick()
+        self.genome.tick()
         self._update_visited()
+        if self.model.agent_grid is not None:
+            self.model.agent_grid.move(self)
 
         if self.carrying:
             self.carrying.pos = self.pos.copy()
+            self.model.object_moved(self.carrying)
 
-        if self._should_evolve and len(self.genome_storage_pool) > STORAGE_THRESHOLD:
-            # perform genetic operations
-            parents = self._perform_selection()
-            children = self._perform_crossover(parents)
-            self._perform_mutation(children)
-            for child in children:
-                child.rebuild_bt()
-                child.fitness = calculate_fitness(child)
-            self.genome_storage_pool = self._select_children(children)
+        self._evolve()
 
     # region Evolution
+    def _evolution_rng(self):
+        return self.model.rng if self.model.streams is None else self.stream.evolution
 
-    def _perform_selection(self):
-        self.genome_storage_pool.sort(key=lambda x: x.get_fitness(), reverse=True)
-        return self.genome_storage_pool[:TRUNCATION_SIZE]
-
-    def _perform_crossover(self, genomes):
-        children = []
-        for i in range(0, len(genomes) - 1, 2):
-            if random.random() > CROSSOVER_PROB:
-                continue
-            parent1 = self.genome_storage_pool[i].genome
-            parent2 = self.genome_storage_pool[i + 1].genome
-            crossover_point = random.randint(0, len(parent1) - 1)
-            child1 = parent1[:crossover_point] + parent2[crossover_point:]
-            child2 = parent2[:crossover_point] + parent1[crossover_point:]
-            children.append(Genome(child1, self, build_bt_from_genome_grammar(self, child1)))
-            children.append(Genome(child2, self, build_bt_from_genome_grammar(self, child2)))
-        return children
-
-    def _perform_mutation(self, genomes, mutation_prob=0.01, codon_bits=8):
-        for genome in genomes:
-            buffer = genome.genome
-            for i, codon in enumerate(buffer):
-                if random.random() < mutation_prob:
-                    # choose which bit to flip
-                    bit_to_flip = random.randint(0, codon_bits - 1)
-
-                    # flip the bit
-                    codon ^= (1 << bit_to_flip)
-
-                    # clamp to valid range
-                    max_value = (1 << codon_bits) - 1
-                    codon = codon & max_value
-
-                    # write back to genome
-                    buffer[i] = codon
-                    # why goddamn bit flipping, why
-            genome.genome = buffer
-
-    def _select_children(self, genomes):
-        genomes.sort(key=lambda x: compute_diversity(x), reverse=True)
-        return genomes[:STORAGE_THRESHOLD]
+    def _evolve(self):
+        if self._should_evolve and len(self.genome_storage_pool) > STORAGE_THRESHOLD:
+            # selection, crossover, mutation and survivor selection on the codon matrix
+            self.genome_storage_pool.evolve(self._evolution_rng())
 
     # endregion
 
@@ -184,14 +186,14 @@ class SwarmAgent(Agent):
             self_fitness = calculate_fitness(self.genome)
             best_genome = None
             best_fitness = None
-            for genome in self.genome_storage_pool:
-                fitness = calculate_fitness(genome)
-                if best_fitness is None or fitness < best_fitness:
-                    best_genome = genome
-                    best_fitness = fitness
+            pool = self.genome_storage_pool
+            if len(pool):
+                best_genome = pool.best()
+                best_fitness = pool.fitness[best_genome]
             if best_genome is not None and self_fitness < best_fitness:
-                self.genome = Genome(best_genome.genome[:], self,
-                                     build_bt_from_genome_grammar(self, best_genome.genome))
+                self.genome = Genome(pool.genome(best_genome), self)
+                if self.model.event_log is not None:
+                    self.model.event_log.adopt(self, self.genome.genome)
 
     # region BT
     def pickup(self, obj):
@@ -202,24 +204,33 @@ class SwarmAgent(Agent):
         if dist(self.pos, obj.pos) > AGENT_SPEED:
             return False
 
-        self.pos = obj.pos
+        self.pos = obj.pos.copy()
         self.blackboard.is_carrying = True
         self.carrying = obj
         obj.picked_up = True
+        self.model.object_index[obj.type].remove(obj)
+        if self.model.event_log is not None:
+            self.model.event_log.pickup(self, obj)
         return True
 
     def drop(self, obj_type):
         if self.carrying and self.carrying.type == obj_type:
+            if self.model.event_log is not None:
+                self.model.event_log.drop(self, self.carrying)
             self.carrying.pos = self.pos.copy()
+            self.model.object_moved(self.carrying)
             self.carrying.picked_up = False
+            self.model.object_index[obj_type].insert(self.carrying)
             self.carrying = None
             self.blackboard.is_carrying = False
             return True
         return False
 
     def explore(self):
-        radians = random.uniform(0, 2 * math.pi)
+        radians = self.stream.uniform(0, 2 * math.pi)
         pos_delta = (AGENT_SPEED * np.array([math.cos(radians), math.sin(radians)]))
+        if self.model.event_log is not None:
+            self.model.event_log.move(self, EXPLORE, pos_delta[0], pos_delta[1])
         # self.pos[0] += pos_delta[0]
         # self.pos[1] += pos_delta[1]
         self.pos += pos_delta
@@ -230,6 +241,8 @@ class SwarmAgent(Agent):
             selected_pos = self.model.hub.pos.copy()
         else:
             selected_pos = self.model.sites[0].pos.copy()
+        if self.model.event_log is not None:
+            self.model.event_log.move(self, TOWARDS, selected_pos[0], selected_pos[1])
 
         if dist(self.pos, selected_pos) > AGENT_SPEED:
             direction = selected_pos - self.pos
@@ -245,6 +258,8 @@ class SwarmAgent(Agent):
         else:
             selected_pos = self.model.sites[0].pos.copy()
             self.blackboard.avoided_last_step_site = True
+        if self.model.event_log is not None:
+            self.model.event_log.move(self, AWAY, selected_pos[0], selected_pos[1])
         direction = self.pos - selected_pos
         norm_direction = (direction - np.min(direction)) / (np.max(direction) - np.min(direction))
         self.pos += (norm_direction * AGENT_SPEED)
@@ -269,15 +284,6 @@ class SwarmAgent(Agent):
         else:
             self.blackboard.nearest_site = None
 
-        available_food = [f for f in self.model.food if not f.picked_up]
-        if not available_food:
-            self.blackboard.nearest_food = None
-        else:
-            self.blackboard.nearest_food = min(available_food, key=lambda o: dist(self.pos, o.pos))
-
-        available_debris = [f for f in self.model.debris if not f.picked_up]
-        if not available_debris:
-            self.blackboard.nearest_debris = None
-        else:
-            self.blackboard.nearest_debris = min(available_debris, key=lambda o: dist(self.pos, o.pos))
+        self.blackboard.nearest_food = self.model.nearest_food(self.pos)
+        self.blackboard.nearest_debris = self.model.nearest_debris(self.pos)
     # endregion
@@ -1,94 +1,318 @@
+import json
 import math
+import os
 import random
 
 import mesa
 import numpy as np
 
+from betr_geese.config import *
+from environment.metrics import METRIC_COLUMNS, ObjectMetrics
 from environment.objects import *
-from environment.swarm_agent import SwarmAgent
+from environment.rng import RNG_MODES, StreamSource
+from environment.scheduler import SCHEDULERS, ArrayScheduler
+from environment.spatial import ObjectGrid, SpatialGrid
+from environment.swarm_agent import BT_BACKENDS, Genome, SwarmAgent
+from environment.swarm_state import SwarmState, VectorSwarmAgent
 from environment.utils import *
 
 
+ENGINES = ("reference", "vectorized")
+
+
+def _pack_random(state):
+    # random.Random state as (version, 624 words + position, gauss_next) -> one float64 array
+    version, internal, gauss_next = state
+    return np.array([version, *internal, np.nan if gauss_next is None else gauss_next], dtype='float64')
+
+
+def _unpack_random(packed):
+    gauss_next = float(packed[-1])
+    return int(packed[0]), tuple(int(v) for v in packed[1:-1]), None if math.isnan(gauss_next) else gauss_next
+
+
 class SwarmModel(mesa.Model):
     # region Setup
     def __init__(self, n_agents=100, world_size=100, n_sites=1, n_food=100, n_debris=100, template_genome=None,
-                 seed=None):
+                 seed=None, spatial_index=True, bt_backend="py_trees", engine="reference", checkpoint_path=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, metric_steps=STEPS, debug_blackboard=False,
+                 rng_mode="global", scheduler="mesa"):
         super().__init__(seed=seed)
+        # what load_checkpoint() rebuilds the model from before restoring the saved state
+        self.params = {"n_agents": n_agents, "world_size": world_size, "n_sites": n_sites, "n_food": n_food,
+                       "n_debris": n_debris, "seed": seed, "spatial_index": spatial_index, "bt_backend": bt_backend,
+                       "engine": engine, "debug_blackboard": debug_blackboard, "rng_mode": rng_mode,
+                       "scheduler": scheduler,
+                       "template_genome": None if template_genome is None else list(template_genome.genome)}
+        # a snapshot is written to checkpoint_path every checkpoint_interval steps
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        # a StepProfiler, a TelemetryRecorder, an EventLog and a ConvergenceMonitor set themselves here while attached
+        self.profiler = None
+        self.recorder = None
+        self.event_log = None
+        self.monitor = None
+        # what the ConvergenceMonitor of a checkpointed run had recorded, the next one attached picks it up
+        self.monitor_state = None
+        # mesa leaves rng unseeded when given a seed, evolution draws from it
+        self.rng = np.random.default_rng(seed)
+        if bt_backend not in BT_BACKENDS:
+            raise ValueError(f"Unknown bt_backend: {bt_backend}")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if rng_mode not in RNG_MODES:
+            raise ValueError(f"Unknown rng_mode: {rng_mode}")
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler: {scheduler}")
+        # "global" draws placements and agent decisions from the random module, "streams" from RandomStreams spawned
+        # from seed, the model's own and one per agent
+        self.streams = StreamSource(seed) if rng_mode == "streams" else None
+        self.stream = random if self.streams is None else self.streams.spawn()
+        # "flyweight" ticks one shared tree per genome against per-agent state instead of a py_trees copy per agent,
+        # "bytecode" runs the same tree lowered to a flat instruction array, "decision" memoizes bytecode ticks
+        self.bt_backend = bt_backend
+        # reference agents keep their state in py_trees blackboard clients instead of AgentState records
+        self.debug_blackboard = debug_blackboard
         self.world_size = world_size
         self.time = 0
+        # genome exchange neighbours come from this grid, None falls back to scanning every agent
+        self.agent_grid = SpatialGrid(GENOME_EXCHANGE_RADIUS) if spatial_index else None
 
         self.hub = Hub(pos=np.array([0, 0], dtype='float64'), radius=10)
         self._init_sites(n_sites)
 
+        # pos and picked_up of every Food and then every Debris, the objects are handles to its rows
+        self.object_store = self._init_object_store(n_food + n_debris)
         self._init_food(n_food)
         self._init_debris(n_debris)
+        # available (not picked up) objects only, pickup() removes and drop() re-inserts
+        self.object_index = {"Food": self._index_objects(self.food, self.object_store),
+                             "Debris": self._index_objects(self.debris, self.object_store)}
+        self.site_index = self._index_objects(self.sites)
+        # evaluation counters kept up to date by object_moved(), and one row of them per step (METRIC_COLUMNS),
+        # preallocated for metric_steps steps
+        self.object_metrics = ObjectMetrics(self.hub, self.food + self.debris)
+        self.metrics = np.full((metric_steps, len(METRIC_COLUMNS)), np.nan)
 
-        if template_genome is None:
-            SwarmAgent.create_agents(self, n_agents)
-        else:
-            SwarmAgent.from_genome(self, template_genome, n_agents)
+        # "vectorized" keeps agent state in SwarmState arrays and senses/moves the whole swarm at once
+        self.engine = engine
+        self.state = SwarmState(self, n_agents) if engine == "vectorized" else None
+        self._init_agents(VectorSwarmAgent if engine == "vectorized" else SwarmAgent, n_agents, template_genome)
+        # "array" activates the agents with an ArrayScheduler, in the order mesa's AgentSet would
+        self.scheduler = scheduler
+        self.agent_array = ArrayScheduler(self) if scheduler == "array" else None
 
     def _init_sites(self, n):
         self.sites = []
         for _ in range(n):
-            angle = random.uniform(0, 2 * math.pi)
+            angle = self.stream.uniform(0, 2 * math.pi)
             r = 30  # fixed from paper
             pos = np.array([r * math.cos(angle), r * math.sin(angle)])
             self.sites.append(Site(pos))
         return self.sites
 
+    def _init_object_store(self, n):
+        return ObjectStore(n)
+
     def _init_food(self, n):
         self.food = []
         for i in range(n):
-            site = random.choice(self.sites)
-            offset = random.uniform(-2, 2), random.uniform(-2, 2)
+            site = self.stream.choice(self.sites)
+            offset = self.stream.uniform(-2, 2), self.stream.uniform(-2, 2)
             pos = (site.pos[0] + offset[0], site.pos[1] + offset[1])
-            self.food.append(Food(pos))
+            self.food.append(Food(self.object_store, i, pos))
         return self.food
 
     def _init_debris(self, n):
         self.debris = []
-        for _ in range(n):
-            offset = random.uniform(-8, 8), random.uniform(-8, 8)
+        first = len(self.food)
+        for i in range(n):
+            offset = self.stream.uniform(-8, 8), self.stream.uniform(-8, 8)
             pos = (self.hub.pos[0] + offset[0], self.hub.pos[1] + offset[1])
-            self.debris.append(Debris(pos))
+            self.debris.append(Debris(self.object_store, first + i, pos))
         return self.debris
 
+    def _init_agents(self, agent_class, n, template_genome):
+        if template_genome is None:
+            return agent_class.create_agents(self, n)
+        return agent_class.from_genome(self, template_genome, n)
+
+    @staticmethod
+    def _index_objects(objects, store=None):
+        # Food and Debris are indexed with the store their rows are in
+        index = SpatialGrid(OBJECT_GRID_CELL_SIZE) if store is None else ObjectGrid(OBJECT_GRID_CELL_SIZE, store)
+        for obj in objects:
+            if not obj.picked_up:
+                index.insert(obj)
+        return index
+
     # endregion
 
     def step(self):
-        self.agents.shuffle_do("sense")
-        self.agents.shuffle_do("act")
-        self.agents.shuffle_do("update")
+        if self.profiler is not None:
+            self.profiler.begin_step(self)
+        agents = self.agents if self.agent_array is None else self.agent_array
+        if self.state is None:
+            agents.shuffle_do("sense")
+            agents.shuffle_do("act")
+        else:
+            # same shuffles in the same order, so the agents draw the same random numbers
+            self.state.sense()
+            agents.shuffle_do("sense")
+            self.state.begin_act()
+            agents.shuffle_do("act")
+            self.state.end_act()
+        agents.shuffle_do("update")
         self.time += 1
+        self._record_metrics()
+        if self.monitor is not None:
+            self.monitor.end_step(self)
+        if self.event_log is not None:
+            self.event_log.end_step(self)
+        if self.recorder is not None:
+            self.recorder.record(self)
+        if self.profiler is not None:
+            self.profiler.end_step(self)
+        if self.checkpoint_path is not None and self.time % self.checkpoint_interval == 0:
+            self.save_checkpoint(self.checkpoint_path)
+
+    # region Checkpoints
+    def save_checkpoint(self, path):
+        # codons, positions and RNG states only, trees are rebuilt from the codons on load. Written to a temporary
+        # file first, so path always holds a complete snapshot.
+        agents = sorted(self.agents, key=lambda a: a.unique_id)
+        objects = self.food + self.debris
+        rows = {obj: i for i, obj in enumerate(objects)}
+        pools = [a.genome_storage_pool for a in agents if a._should_evolve]
+        arrays = {
+            "random": _pack_random(random.getstate()),
+            "model_random": _pack_random(self.random.getstate()),
+            "agent_pos": np.array([a.pos for a in agents], dtype='float64').reshape(-1, 2),
+            "carrying": np.array([rows.get(a.carrying, -1) for a in agents], dtype=np.int32),
+            "genomes": np.array([a.genome.genome for a in agents], dtype=np.uint8),
+            "pool_sizes": np.array([len(a.genome_storage_pool) if a._should_evolve else 0 for a in agents],
+                                   dtype=np.int32),
+            "pools": np.concatenate([p.codons[:len(p)] for p in pools]) if pools else np.zeros((0, 0), np.uint8),
+            "site_pos": np.array([s.pos for s in self.sites], dtype='float64').reshape(-1, 2),
+            "object_pos": self.object_store.pos.copy(),
+            "object_picked": self.object_store.picked.copy(),
+            "metrics": self.metric_series(),
+        }
+        meta = {"params": self.params, "time": self.time, "steps": self.steps, "running": self.running,
+                "rng": self.rng.bit_generator.state}
+        if self.streams is not None:
+            meta["streams"] = [self.stream.get_state()] + [a.stream.get_state() for a in agents]
+        if self.monitor is not None:
+            meta["monitor"] = self.monitor.get_state()
+        arrays["meta"] = np.array(json.dumps(meta))
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_checkpoint(cls, path, **kwargs):
+        # kwargs are passed on to the constructor, e.g. checkpoint_path to keep checkpointing
+        with np.load(path) as data:
+            data = dict(data)
+        meta = json.loads(str(data["meta"]))
+        params = dict(meta["params"])
+        template = params.pop("template_genome")
+        model = cls(template_genome=None if template is None else Genome(template, None), **params, **kwargs)
+        model._restore(data, meta)
+        return model
+
+    def _restore(self, data, meta):
+        objects = self.food + self.debris
+        for site, pos in zip(self.sites, data["site_pos"]):
+            site.pos = pos.copy()
+        self.object_store.pos[:] = data["object_pos"]
+        self.object_store.picked[:] = data["object_picked"]
+        for obj in objects:
+            # the fresh indexes hold every object, ranked in list order like the saved run's did
+            if obj.picked_up:
+                self.object_index[obj.type].remove(obj)
+            else:
+                self.object_index[obj.type].move(obj)
+        self.site_index = self._index_objects(self.sites)
+        self.object_metrics = ObjectMetrics(self.hub, objects)
+
+        agents = sorted(self.agents, key=lambda a: a.unique_id)
+        pool_start = np.concatenate([[0], np.cumsum(data["pool_sizes"])])
+        for i, agent in enumerate(agents):
+            agent.pos = data["agent_pos"][i].copy()
+            agent.carrying = objects[data["carrying"][i]] if data["carrying"][i] >= 0 else None
+            agent.blackboard.is_carrying = agent.carrying is not None
+            agent.genome = Genome(data["genomes"][i].tolist(), agent)
+            if agent._should_evolve:
+                agent.genome_storage_pool.replace(data["pools"][pool_start[i]:pool_start[i + 1]])
+            if self.agent_grid is not None:
+                self.agent_grid.move(agent)
+        if self.state is not None:
+            self.state.touched = {}
+
+        self.time = meta["time"]
+        self._grow_metrics(self.time)
+        self.metrics[:self.time] = data["metrics"]
+        self.steps = meta["steps"]
+        self.running = meta["running"]
+        self.rng.bit_generator.state = meta["rng"]
+        if self.streams is not None:
+            for stream, state in zip([self.stream] + [a.stream for a in agents], meta["streams"]):
+                stream.set_state(state)
+        self.monitor_state = meta.get("monitor")
+        self.random.setstate(_unpack_random(data["model_random"]))
+        random.setstate(_unpack_random(data["random"]))
+
+    # endregion
 
     # region Evaluation
     def food_at_hub_fraction(self):
-        at_hub = sum(
-            1 for f in self.food
-            if dist(f.pos, self.hub.pos) <= self.hub.radius
-        )
-        return at_hub / len(self.food)
+        return self.object_metrics.food_at_hub / len(self.food)
 
     def debris_removed_fraction(self):
-        removed = sum(
-            1 for d in self.debris
-            if self.debris_is_outside_boundary(d.pos)
-        )
-        return removed / len(self.debris)
+        return self.object_metrics.debris_removed / len(self.debris)
+
+    def metric_series(self):
+        # (maintenance, foraging) after every step so far
+        return self.metrics[:self.time]
+
+    def _grow_metrics(self, steps):
+        if steps > len(self.metrics):
+            grown = np.full((max(steps, 2 * len(self.metrics)), len(METRIC_COLUMNS)), np.nan)
+            grown[:len(self.metrics)] = self.metrics
+            self.metrics = grown
+
+    def _record_metrics(self):
+        self._grow_metrics(self.time)
+        row = self.metrics[self.time - 1]
+        # nan for a column without any objects, e.g. a world without debris
+        row[0] = self.debris_removed_fraction() if self.debris else np.nan
+        row[1] = self.food_at_hub_fraction() if self.food else np.nan
 
     # endregion
 
     # region Helpers
+    def object_moved(self, obj):
+        self.object_metrics.moved(obj)
+
+    def agents_near(self, agent, radius):
+        if self.agent_grid is None:
+            return [a for a in self.agents if a is not agent and dist(agent.pos, a.pos) <= radius]
+        return [a for a in self.agent_grid.within(agent.pos, radius) if a is not agent]
+
     def debris_is_outside_boundary(self, pos):
         return dist(pos, self.hub.pos) > self.hub.debris_boundary
 
     def nearest_site(self, pos):
-        return min(self.sites, key=lambda s: dist(pos, s.pos), default=None)
+        return self.site_index.nearest(pos)
 
     def nearest_food(self, pos):
-        return min(self.food, key=lambda f: dist(pos, f.pos), default=None)
+        return self.object_index["Food"].nearest(pos)
 
     def nearest_debris(self, pos):
-        return min(self.debris, key=lambda d: dist(pos, d.pos), default=None)
+        return self.object_index["Debris"].nearest(pos)
     # endregion
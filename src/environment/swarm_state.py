@@ -0,0 +1,274 @@
+import math
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.movement import *
+from environment.objects import *
+from environment.swarm_agent import SwarmAgent
+from environment.utils import *
+
+# elements per block of the agent x object distance matrices, so each temporary distances() makes stays at 8 MB
+# however many objects there are
+NEAREST_BLOCK_ELEMENTS = 1 << 20
+
+
+def nearest_rows(queries, points, budget=NEAREST_BLOCK_ELEMENTS):
+    # index of min(points, key=dist) for every query, points in rank order. Like min() the first of equal
+    # distances wins and a nan distance only wins if it comes first.
+    result = np.full(len(queries), -1, dtype=np.intp)
+    if not len(points):
+        return result
+    chunk = max(1, budget // len(points))
+    for start in range(0, len(queries), chunk):
+        block = queries[start:start + chunk]
+        d = distances(block[:, None, :], points[None, :, :])
+        first_nan = np.isnan(d[:, 0])
+        d[np.isnan(d)] = np.inf
+        rows = np.argmin(d, axis=1)
+        rows[first_nan] = 0
+        result[start:start + len(block)] = rows
+    return result
+
+
+class SwarmState:
+    # positions, carried objects and blackboard flags of every agent, one row per agent in creation order
+    def __init__(self, model, capacity):
+        self.model = model
+        self.agents = []
+        self.pos = np.zeros((capacity, 2))
+        self.carrying = np.full(capacity, -1, dtype=np.intp)
+        self.near_hub = np.zeros(capacity, dtype=bool)
+        self.near_site = np.zeros(capacity, dtype=bool)
+        self.nearest_food = np.full(capacity, -1, dtype=np.intp)
+        self.nearest_debris = np.full(capacity, -1, dtype=np.intp)
+        self.visited_hub = np.zeros(capacity, dtype=bool)
+        self.visited_site = np.zeros(capacity, dtype=bool)
+        self.avoided_hub = np.zeros(capacity, dtype=bool)
+        self.avoided_site = np.zeros(capacity, dtype=bool)
+        # carrying and nearest_* index into objects (rows of the model's object store), -1 for nothing
+        self.objects = model.food + model.debris
+        self.store = model.object_store
+        # agents whose position changed this act phase, in the order they first did
+        self.touched = {}
+
+    def __len__(self):
+        return len(self.agents)
+
+    def add(self, agent):
+        row = len(self.agents)
+        if row == len(self.pos):
+            self._grow(2 * row or 1)
+        self.agents.append(agent)
+        return row
+
+    def _grow(self, capacity):
+        for name in ("pos", "carrying", "near_hub", "near_site", "nearest_food", "nearest_debris", "visited_hub",
+                     "visited_site", "avoided_hub", "avoided_site"):
+            old = getattr(self, name)
+            fill = np.full((capacity - len(old),) + old.shape[1:], -1 if old.dtype == np.intp else 0, dtype=old.dtype)
+            setattr(self, name, np.concatenate([old, fill]))
+
+    def object_at(self, row):
+        return self.objects[row] if row >= 0 else None
+
+    def object_row(self, obj):
+        return -1 if obj is None else obj.row
+
+    # region Phases
+    def sense(self):
+        # find_closest_objects for the whole swarm
+        n = len(self.agents)
+        pos = self.pos[:n]
+        model = self.model
+        self.near_hub[:n] = distances(pos, model.hub.pos) <= NEST_RADIUS
+        self.near_site[:n] = distances(pos, model.sites[0].pos) <= SITE_RADIUS
+        self.nearest_food[:n] = self._nearest(pos, model.object_index["Food"])
+        self.nearest_debris[:n] = self._nearest(pos, model.object_index["Debris"])
+
+    def _nearest(self, pos, index):
+        items = index.ranked()
+        if not items:
+            return -1
+        rows = np.array([obj.row for obj in items], dtype=np.intp)
+        return rows[nearest_rows(pos, self.store.pos[rows])]
+
+    def begin_act(self):
+        # the part of act() before the tick: reset the flags, sync carried objects, first visited check
+        n = len(self.agents)
+        self.avoided_hub[:n] = False
+        self.avoided_site[:n] = False
+        self.sync_carried()
+        self.visited_hub[:n] = False
+        self.visited_site[:n] = False
+        self.update_visited()
+
+    def end_act(self):
+        # the part after it: run the queued moves, second visited check, agent grid, carried objects again
+        self.apply_queued()
+        self.update_visited()
+        if self.model.agent_grid is not None:
+            for agent in self.touched:
+                self.model.agent_grid.move(agent)
+        self.touched = {}
+        self.sync_carried()
+
+    def update_visited(self):
+        n = len(self.agents)
+        pos = self.pos[:n]
+        self.visited_site[:n] |= distances(pos, self.model.sites[0].pos) <= SITE_RADIUS
+        self.visited_hub[:n] |= distances(pos, self.model.hub.pos) <= NEST_RADIUS
+
+    def sync_carried(self):
+        for row in np.flatnonzero(self.carrying[:len(self.agents)] >= 0):
+            obj = self.objects[self.carrying[row]]
+            obj.pos = self.pos[row]
+            self.model.object_moved(obj)
+
+    # endregion
+
+    # region Movement
+    def queue(self, agent, move):
+        agent._moves.append(move)
+        if self.model.event_log is not None:
+            self.model.event_log.move(agent, *move)
+        self.touched[agent] = None
+
+    def apply_queued(self):
+        # an agent's k-th move goes in wave k, so every wave moves each agent at most once
+        waves = []
+        for agent in self.touched:
+            for k, move in enumerate(agent._moves):
+                if k == len(waves):
+                    waves.append(([], []))
+                waves[k][0].append(agent._row)
+                waves[k][1].append(move)
+            agent._moves.clear()
+        for rows, moves in waves:
+            kinds, xs, ys = zip(*moves)
+            apply_moves(self.pos, np.array(rows), np.array(kinds), np.array(xs), np.array(ys))
+
+    def flush(self, agent):
+        # something reads the position mid-tick, run this agent's moves now
+        rows = np.array([agent._row])
+        for kind, x, y in agent._moves:
+            apply_moves(self.pos, rows, np.array([kind]), np.array([x]), np.array([y]))
+        agent._moves.clear()
+
+    # endregion
+
+
+def _flag(name):
+    def get(self):
+        return bool(getattr(self._state, name)[self._row])
+
+    def set(self, value):
+        getattr(self._state, name)[self._row] = value
+
+    return property(get, set)
+
+
+class ArrayBlackboard:
+    # AgentState of a SwarmState row, the flags live in the arrays
+    __slots__ = ("_state", "_row", "hub", "site", "target_object")
+
+    def __init__(self, state, row):
+        self._state = state
+        self._row = row
+        self.hub = None
+        self.site = None
+        self.target_object = None
+
+    visited_hub = _flag("visited_hub")
+    visited_site = _flag("visited_site")
+    avoided_last_step_hub = _flag("avoided_hub")
+    avoided_last_step_site = _flag("avoided_site")
+
+    @property
+    def nearest_food(self):
+        return self._state.object_at(self._state.nearest_food[self._row])
+
+    @property
+    def nearest_debris(self):
+        return self._state.object_at(self._state.nearest_debris[self._row])
+
+    @property
+    def nearest_hub(self):
+        return self._state.model.hub if self._state.near_hub[self._row] else None
+
+    @property
+    def nearest_site(self):
+        return self._state.model.sites[0] if self._state.near_site[self._row] else None
+
+    @property
+    def is_carrying(self):
+        return self._state.carrying[self._row] >= 0
+
+    @is_carrying.setter
+    def is_carrying(self, value):
+        # follows the carrying row, pickup() and drop() still assign it
+        pass
+
+
+class VectorSwarmAgent(SwarmAgent):
+    # SwarmAgent backed by a SwarmState row, only the BT tick and evolution run per agent. Moves are queued and
+    # run for the whole swarm after the act phase, reading pos in between runs this agent's queue first.
+    def __init__(self, model, genome=None):
+        self._state = model.state
+        self._row = model.state.add(self)
+        self._moves = []
+        super().__init__(model, genome)
+
+    @property
+    def pos(self):
+        if self._moves:
+            self._state.flush(self)
+        return self._state.pos[self._row]
+
+    @pos.setter
+    def pos(self, value):
+        # mesa's Agent.__init__ assigns None
+        if value is None:
+            return
+        if self._moves:
+            self._state.flush(self)
+        self._state.pos[self._row] = value
+        self._state.touched[self] = None
+
+    @property
+    def carrying(self):
+        return self._state.object_at(self._state.carrying[self._row])
+
+    @carrying.setter
+    def carrying(self, obj):
+        self._state.carrying[self._row] = self._state.object_row(obj)
+
+    def _init_blackboard(self):
+        self.blackboard = ArrayBlackboard(self._state, self._row)
+
+    def sense(self):
+        # SwarmState.sense() already found the closest objects
+        if self._should_evolve:
+            self.share_genome()
+
+    def act(self):
+        # SwarmState.begin_act() and end_act() do the rest
+        self.genome.tick()
+        self._evolve()
+
+    def explore(self):
+        radians = self.stream.uniform(0, 2 * math.pi)
+        self._state.queue(self, (EXPLORE, AGENT_SPEED * math.cos(radians), AGENT_SPEED * math.sin(radians)))
+
+    def move_towards(self, obj_type):
+        target = self.model.hub.pos if obj_type == SObjects.Hub else self.model.sites[0].pos
+        self._state.queue(self, (TOWARDS, target[0], target[1]))
+
+    def move_away(self, obj_type):
+        if obj_type == SObjects.Hub:
+            target = self.model.hub.pos
+            self.blackboard.avoided_last_step_hub = True
+        else:
+            target = self.model.sites[0].pos
+            self.blackboard.avoided_last_step_site = True
+        self._state.queue(self, (AWAY, target[0], target[1]))
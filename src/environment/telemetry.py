@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.metrics import METRIC_COLUMNS
+
+# One .npy file per field in a directory, preallocated for the whole run and written through memory maps, row r
+# holding step (r + 1) * stride. progress.npy holds how many rows are complete and is only bumped once a row is
+# written, so readers can open the files with load_telemetry() at any time, also while the run is still going.
+
+FIELDS = ("time", "positions", "carrying", "fitness", "metrics")
+
+
+def _layout(n_agents, rows):
+    return {
+        "time": ((rows,), np.int64),
+        "positions": ((rows, n_agents, 2), np.float64),
+        # index into model.food + model.debris, -1 for nothing
+        "carrying": ((rows, n_agents), np.int32),
+        "fitness": ((rows, n_agents), np.float64),
+        "metrics": ((rows, len(METRIC_COLUMNS)), np.float64),
+        "progress": ((1,), np.int64),
+    }
+
+
+def _open(path, shape, dtype):
+    # reuse the file of an earlier (e.g. checkpointed) run with the same layout, rows it already holds are kept
+    if os.path.exists(path):
+        existing = np.lib.format.open_memmap(path, mode="r+")
+        if existing.shape == shape and existing.dtype == dtype:
+            return existing
+        del existing
+    return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+
+class TelemetryRecorder:
+    # agents are recorded in unique_id order, steps past `steps` are not recorded
+    def __init__(self, directory, n_agents, steps=STEPS, stride=TELEMETRY_STRIDE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.stride = stride
+        self.rows = steps // stride
+        self.arrays = {name: _open(os.path.join(directory, f"{name}.npy"), shape, dtype)
+                       for name, (shape, dtype) in _layout(n_agents, self.rows).items()}
+        self._model = None
+        self._agents = None
+        self._object_rows = None
+
+    def attach(self, model):
+        agents = sorted(model.agents, key=lambda a: a.unique_id)
+        if len(agents) != self.arrays["positions"].shape[1]:
+            raise ValueError(f"recorder is laid out for {self.arrays['positions'].shape[1]} agents, "
+                             f"the model has {len(agents)}")
+        self._model = model
+        self._agents = agents
+        self._object_rows = {obj: i for i, obj in enumerate(model.food + model.debris)}
+        # rows past the model's step are stale, a fresh run reusing the directory starts with none
+        self.arrays["progress"][0] = min(self.arrays["progress"][0], model.time // self.stride)
+        model.recorder = self
+        return self
+
+    def detach(self):
+        if self._model is not None:
+            self._model.recorder = None
+            self._model = None
+
+    def record(self, model):
+        # called by SwarmModel.step() once the step is done
+        if model.time % self.stride:
+            return
+        row = model.time // self.stride - 1
+        if row >= self.rows:
+            return
+        arrays = self.arrays
+        agents = self._agents
+        if model.state is not None:
+            arrays["positions"][row] = model.state.pos[:len(agents)]
+            arrays["carrying"][row] = model.state.carrying[:len(agents)]
+        else:
+            arrays["positions"][row] = [a.pos for a in agents]
+            rows = self._object_rows
+            arrays["carrying"][row] = [rows[a.carrying] if a.carrying is not None else -1 for a in agents]
+        arrays["fitness"][row] = [a.genome.fitness for a in agents]
+        arrays["metrics"][row] = model.metrics[model.time - 1]
+        arrays["time"][row] = model.time
+        # rows past this one are from an earlier run in the same directory, or get rewritten by a resumed one
+        arrays["progress"][0] = row + 1
+
+    def flush(self):
+        for array in self.arrays.values():
+            array.flush()
+
+    def close(self):
+        self.detach()
+        self.flush()
+        self.arrays = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_telemetry(directory):
+    # read only memory maps of the complete rows, nothing is copied
+    progress = int(np.load(os.path.join(directory, "progress.npy"))[0])
+    return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")[:progress] for name in FIELDS}
@@ -1,3 +1,4 @@
+import math
 from enum import Enum
 
 
@@ -12,4 +13,7 @@ class DObjects(Enum):
 
 
 def dist(a, b):
-    return ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
+    # plain IEEE ops (no pow) so numpy gets bit-identical distances, see movement.distances
+    dx = a[0] - b[0]
+    dy = a[1] - b[1]
+    return math.sqrt(dx * dx + dy * dy)
@@ -0,0 +1,144 @@
+import os
+import queue
+import random
+import traceback
+from multiprocessing import get_context
+
+import numpy as np
+
+from betr_geese.config import *
+from environment.genotype_to_phenotype import calculate_fitness
+from environment.swarm_agent import Genome
+from environment.swarm_model import SwarmModel
+
+TOPOLOGIES = ("ring", "full")
+
+
+def migration_targets(topology, n_islands):
+    # island -> islands it sends its migrants to
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology: {topology}")
+    if topology == "ring":
+        return [[(i + 1) % n_islands] if n_islands > 1 else [] for i in range(n_islands)]
+    return [[j for j in range(n_islands) if j != i] for i in range(n_islands)]
+
+
+def island_seeds(n_islands, seed=TRIAL_SEED):
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(n_islands)]
+
+
+def emigrants(model, count):
+    # codons of the fittest distinct genomes on the island, one uint8 row each
+    agents = sorted(model.agents, key=lambda a: a.unique_id)
+    genomes = sorted((a.genome for a in agents), key=calculate_fitness, reverse=True)
+    rows, seen = [], set()
+    for genome in genomes:
+        key = tuple(genome.genome)
+        if key not in seen:
+            seen.add(key)
+            rows.append(key)
+        if len(rows) == count:
+            break
+    return np.array(rows, dtype=np.uint8)
+
+
+def immigrate(model, codons, recipients=1):
+    # every incoming genome lands in the storage pool of `recipients` agents drawn with the model's rng
+    agents = [a for a in sorted(model.agents, key=lambda a: a.unique_id) if a._should_evolve]
+    for row in codons:
+        for agent in model.random.sample(agents, min(recipients, len(agents))):
+            agent.genome_storage_pool.append(row)
+
+
+def _island(island, seed, targets, inboxes, results, abort, settings):
+    try:
+        random.seed(seed)
+        model = SwarmModel(n_agents=settings["n_agents"], seed=seed, bt_backend=settings["bt_backend"],
+                           engine=settings["engine"])
+        # migrants that arrived ahead of their epoch, by epoch and sender
+        early = {}
+        senders = sum(island in t for t in targets)
+        epoch = 0
+        for step in range(1, settings["steps"] + 1):
+            model.step()
+            if step % settings["interval"] or step == settings["steps"]:
+                continue
+            outgoing = emigrants(model, settings["migrants"])
+            for target in targets[island]:
+                inboxes[target].put((epoch, island, outgoing))
+            arrived = early.pop(epoch, {})
+            while len(arrived) < senders:
+                try:
+                    message_epoch, sender, codons = inboxes[island].get(timeout=0.1)
+                except queue.Empty:
+                    if abort.is_set():
+                        return
+                    continue
+                if message_epoch == epoch:
+                    arrived[sender] = codons
+                else:
+                    early.setdefault(message_epoch, {})[sender] = codons
+            # sender order, not arrival order, so the run is reproducible
+            for sender in sorted(arrived):
+                immigrate(model, arrived[sender], settings["recipients"])
+            epoch += 1
+
+        best = emigrants(model, 1)[0]
+        results.put(("done", island, {"island": island, "seed": seed,
+                                      "maintenance": model.debris_removed_fraction(),
+                                      "foraging": model.food_at_hub_fraction(),
+                                      "genome": best.tolist(),
+                                      "fitness": calculate_fitness(Genome(best.tolist(), None))}))
+    except Exception:
+        abort.set()
+        results.put(("error", island, traceback.format_exc()))
+
+
+def run_islands(n_islands=None, topology=ISLAND_TOPOLOGY, interval=ISLAND_MIGRATION_INTERVAL,
+                migrants=ISLAND_MIGRANTS, recipients=ISLAND_RECIPIENTS, n_agents=N_AGENTS, steps=STEPS,
+                seed=TRIAL_SEED, bt_backend="decision", engine="reference"):
+    # one SwarmModel per process, every `interval` steps each island sends its `migrants` fittest genomes to its
+    # targets in the topology and waits for the ones sent to it. Returns one result per island, in island order.
+    n_islands = n_islands or os.cpu_count()
+    targets = migration_targets(topology, n_islands)
+    seeds = island_seeds(n_islands, seed)
+    settings = {"n_agents": n_agents, "steps": steps, "interval": interval, "migrants": migrants,
+                "recipients": recipients, "bt_backend": bt_backend, "engine": engine}
+
+    context = get_context()
+    inboxes = [context.Queue() for _ in range(n_islands)]
+    results = context.Queue()
+    abort = context.Event()
+    processes = [context.Process(target=_island, daemon=True,
+                                 args=(i, seeds[i], targets, inboxes, results, abort, settings))
+                 for i in range(n_islands)]
+    for process in processes:
+        process.start()
+
+    finished, errors = {}, []
+    while len(finished) + len(errors) < n_islands:
+        try:
+            status, island, payload = results.get(timeout=1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                errors.append("island processes exited without reporting")
+                break
+            continue
+        if status == "done":
+            finished[island] = payload
+        else:
+            errors.append(payload)
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+    if errors:
+        raise RuntimeError("island failed:\n" + "\n".join(errors))
+    return [finished[i] for i in range(n_islands)]
+
+
+if __name__ == '__main__':
+    islands = run_islands()
+    for result in islands:
+        print(f"Island {result['island']}:\nMaintenance:{result['maintenance']}\nForaging:{result['foraging']}\n"
+              f"Best fitness:{result['fitness']}\n")
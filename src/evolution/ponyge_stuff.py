@@ -0,0 +1,168 @@
+# Grammar compiler and iterative genotype-to-phenotype mapper.
+#
+# compile_grammar() flattens a grammar dict (see environment/genotype_to_phenotype.GRAMMAR) into integer tables once,
+# map_genome() then walks those tables with an explicit stack. The derivation is emitted in preorder as two parallel
+# lists, terminal ids and child counts, instead of as nested node objects.
+
+# production kinds
+SYMBOL = 0  # "symbol": expand one symbol
+PICK = 1  # ["Prefix", "options"]: pick the suffix from a table, yields the terminal "Prefix_suffix"
+COMPOSITE = 2  # {"Sequence": [...]}: a composite terminal whose children are the expansions of the listed symbols
+CONCAT = 3  # ("a", "b"): expansions of the listed symbols, side by side
+UNDEFINED = 4  # names that only make sense as pick options ("Site", "Food"), expanding one is an error
+
+_CLOSE = -1
+
+
+class CompiledGrammar:
+    def __init__(self, terminals, non_terminals, start, fallback):
+        # symbol ids: terminals are 0..n_terminals-1, non-terminal i is n_terminals + i
+        self.terminals = list(terminals)
+        self.non_terminals = list(non_terminals)
+        self.n_terminals = len(self.terminals)
+        self.ids = {name: i for i, name in enumerate(self.terminals + self.non_terminals)}
+        self.start = self.ids[start]
+        self.fallback = self.ids[fallback]
+
+        # per non-terminal: slice of the production table
+        self.rule_offset = []
+        self.rule_count = []
+        # per production: kind, value (symbol / composite terminal / pick table) and slice of prod_args
+        self.prod_kind = []
+        self.prod_value = []
+        self.prod_arg_offset = []
+        self.prod_arg_count = []
+        self.prod_args = []
+        self.undefined = []
+        # pick tables: option >= 0 is a symbol id, option < 0 is ~(nested pick table)
+        self.pick_offset = []
+        self.pick_count = []
+        self.pick_options = []
+
+    def symbol_id(self, name):
+        return self.ids[name]
+
+    def terminal_name(self, terminal_id):
+        return self.terminals[terminal_id]
+
+
+def compile_grammar(grammar, terminals, start="root", fallback="DummyNode"):
+    compiled = CompiledGrammar(terminals, grammar.keys(), start, fallback)
+
+    def symbol(name):
+        if name not in compiled.ids:
+            raise ValueError(f"Unknown symbol: {name}")
+        return compiled.ids[name]
+
+    def pick_table(prefix, options_symbol, nested=False):
+        options = []
+        for option in grammar[options_symbol]:
+            if option in grammar and not nested:
+                # "objects" style options, one more codon picks the concrete object
+                options.append(~pick_table(prefix, option, nested=True))
+            else:
+                options.append(symbol(prefix + "_" + option))
+        table = len(compiled.pick_offset)
+        compiled.pick_offset.append(len(compiled.pick_options))
+        compiled.pick_count.append(len(options))
+        compiled.pick_options.extend(options)
+        return table
+
+    def add_production(kind, value, args=()):
+        compiled.prod_kind.append(kind)
+        compiled.prod_value.append(value)
+        compiled.prod_arg_offset.append(len(compiled.prod_args))
+        compiled.prod_arg_count.append(len(args))
+        compiled.prod_args.extend(args)
+
+    for name, productions in grammar.items():
+        compiled.rule_offset.append(len(compiled.prod_kind))
+        compiled.rule_count.append(len(productions))
+        for production in productions:
+            if isinstance(production, str):
+                if production in compiled.ids:
+                    add_production(SYMBOL, symbol(production))
+                else:
+                    add_production(UNDEFINED, len(compiled.undefined))
+                    compiled.undefined.append(production)
+            elif isinstance(production, list):
+                assert len(production) == 2
+                add_production(PICK, pick_table(production[0], production[1]))
+            elif isinstance(production, dict):
+                parent = sorted(production.keys())[0]
+                assert len(production[parent]) > 0
+                add_production(COMPOSITE, symbol(parent), [symbol(child) for child in production[parent]])
+            elif isinstance(production, tuple):
+                add_production(CONCAT, -1, [symbol(child) for child in production])
+            else:
+                raise ValueError(f"Invalid production type: {production}")
+    return compiled
+
+
+def map_genome(compiled, genome, max_depth, start=None, genome_idx=0, depth=0):
+    # returns (terminal ids in preorder, child count per node, index of the next unused codon)
+    n_codons = len(genome)
+    n_terminals = compiled.n_terminals
+    fallback = compiled.fallback
+    rule_offset = compiled.rule_offset
+    rule_count = compiled.rule_count
+    prod_kind = compiled.prod_kind
+    prod_value = compiled.prod_value
+    prod_arg_offset = compiled.prod_arg_offset
+    prod_arg_count = compiled.prod_arg_count
+    prod_args = compiled.prod_args
+    pick_offset = compiled.pick_offset
+    pick_count = compiled.pick_count
+    pick_options = compiled.pick_options
+
+    # stack entries pack (symbol, depth) into one int, _CLOSE ends the innermost open composite
+    depth_base = max(max_depth, depth) + 2
+    stack = [(compiled.start if start is None else start) * depth_base + depth]
+    nodes = []
+    arity = []
+    parents = []
+    while stack:
+        entry = stack.pop()
+        if entry == _CLOSE:
+            parents.pop()
+            continue
+        symbol, depth = divmod(entry, depth_base)
+
+        if symbol < n_terminals or depth > max_depth:
+            if parents:
+                arity[parents[-1]] += 1
+            nodes.append(symbol if symbol < n_terminals else fallback)
+            arity.append(0)
+            continue
+
+        rule = symbol - n_terminals
+        production = rule_offset[rule] + genome[genome_idx % n_codons] % rule_count[rule]
+        genome_idx += 1
+        kind = prod_kind[production]
+        child = depth + 1
+
+        if kind == SYMBOL:
+            stack.append(prod_value[production] * depth_base + child)
+        elif kind == PICK:
+            table = prod_value[production]
+            option = pick_options[pick_offset[table] + genome[genome_idx % n_codons] % pick_count[table]]
+            if option < 0:
+                genome_idx += 1
+                table = ~option
+                option = pick_options[pick_offset[table] + genome[genome_idx % n_codons] % pick_count[table]]
+            genome_idx += 1
+            stack.append(option * depth_base + child)
+        elif kind == UNDEFINED:
+            raise ValueError(f"Unknown symbol: {compiled.undefined[prod_value[production]]}")
+        else:
+            if kind == COMPOSITE:
+                if parents:
+                    arity[parents[-1]] += 1
+                parents.append(len(nodes))
+                nodes.append(prod_value[production])
+                arity.append(0)
+                stack.append(_CLOSE)
+            offset = prod_arg_offset[production]
+            for i in range(offset + prod_arg_count[production] - 1, offset - 1, -1):
+                stack.append(prod_args[i] * depth_base + child)
+    return nodes, arity, genome_idx